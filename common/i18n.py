@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import ast
+import functools
+from gettext import GNUTranslations, NullTranslations, translation
+import io
+import os
+from pathlib import Path
+import struct
+import threading
+from typing import Callable, Optional
+
+
+# Traducciones que se buscan cuando se usan, no al importar, y que se
+# pueden cambiar de idioma sin reiniciar la aplicación.
+#
+# Cada idioma se carga una sola vez: desde su `.po`, que se compila en
+# memoria como haría `msgfmt`, o si no lo hay, desde el `.mo` instalado
+# con `gettext`.
+
+
+def gettext_noop(message: str) -> str:
+    # Marca el texto para xgettext, pero se traduce más tarde
+    return message
+
+
+def _unquote(line: str) -> str:
+    return ast.literal_eval(line)
+
+
+def parse_po(source: str) -> dict[str, str]:
+    # Devuelve el catálogo como lo guarda un `.mo`: los plurales con
+    # las formas separadas por \0 y el contexto delante con \4.
+    # Como `msgfmt`, se saltan las traducciones "fuzzy" y vacías.
+    catalog = {}
+    entry = {}
+    field = None
+    fuzzy = False
+
+    def flush() -> None:
+        nonlocal entry, fuzzy
+        if 'msgid' in entry and not (fuzzy and entry['msgid']):
+            msgid = entry['msgid']
+            if 'msgid_plural' in entry:
+                msgid += "\0" + entry['msgid_plural']
+                forms = sorted(key for key in entry if key.startswith('msgstr['))
+                msgstr = "\0".join(entry[key] for key in forms)
+            else:
+                msgstr = entry.get('msgstr', "")
+            if 'msgctxt' in entry:
+                msgid = entry['msgctxt'] + "\x04" + msgid
+            if msgstr.strip("\0"):
+                catalog[msgid] = msgstr
+        entry = {}
+        fuzzy = False
+
+    for line in source.splitlines():
+        line = line.strip()
+        # Los comentarios y un msgid detrás de un msgstr empiezan otra
+        # entrada
+        starts_entry = line.startswith("#") or line.startswith(('msgctxt ', 'msgid '))
+        if starts_entry and any(key.startswith('msgstr') for key in entry):
+            flush()
+        if line.startswith("#,") and 'fuzzy' in line:
+            fuzzy = True
+        elif not line or line.startswith("#"):
+            continue
+        elif line.startswith('"'):
+            entry[field] += _unquote(line)
+        else:
+            field, _space, value = line.partition(" ")
+            entry[field] = _unquote(value)
+    flush()
+    return catalog
+
+
+def compile_mo(catalog: dict[str, str]) -> bytes:
+    # Mismo formato que genera `msgfmt`, sin la tabla hash
+    keys = sorted(catalog)
+    ids = [key.encode() for key in keys]
+    strs = [catalog[key].encode() for key in keys]
+    header_size = 7 * 4
+    table_size = len(keys) * 8
+    offset = header_size + 2 * table_size
+    originals, translations = [], []
+    data = io.BytesIO()
+    for string, table in [(s, originals) for s in ids] + [(s, translations) for s in strs]:
+        table.append((len(string), offset + data.tell()))
+        data.write(string + b"\0")
+    output = io.BytesIO()
+    output.write(struct.pack(
+        "Iiiiiii", 0x950412de, 0, len(keys),
+        header_size, header_size + table_size, 0, 0
+    ))
+    for length, start in originals + translations:
+        output.write(struct.pack("ii", length, start))
+    output.write(data.getvalue())
+    return output.getvalue()
+
+
+def _candidates(language: str) -> list[str]:
+    # es_ES.UTF-8@euro -> es_ES, es
+    language = language.split('.')[0].split('@')[0]
+    candidates = [language]
+    if "_" in language:
+        candidates.append(language.split("_")[0])
+    return candidates
+
+
+def environment_language() -> str:
+    # El mismo orden que usa gettext
+    for variable in ('LANGUAGE', 'LC_ALL', 'LC_MESSAGES', 'LANG'):
+        value = os.environ.get(variable)
+        if value:
+            return value.split(':')[0]
+    return 'C'
+
+
+class Translator:
+    def __init__(self) -> None:
+        self.domain = None
+        self.po_dir = None
+        self.mo_dir = None
+        self.lock = threading.Lock()
+        self.catalogs = {}
+        self.listeners = []
+        self.language = None
+        self.translations = NullTranslations()
+        self._ngettext = functools.lru_cache(maxsize= 512)(self.translations.ngettext)
+
+    def configure(
+            self,
+            domain: str,
+            po_dir: Optional[Path]= None,
+            mo_dir: Optional[Path]= None,
+            language: Optional[str]= None
+    ) -> None:
+        self.domain = domain
+        self.po_dir = po_dir
+        self.mo_dir = mo_dir
+        with self.lock:
+            self.catalogs.clear()
+        self.set_language(language)
+
+    def load(self, language: str) -> NullTranslations:
+        with self.lock:
+            if language not in self.catalogs:
+                self.catalogs[language] = self._load(language)
+            return self.catalogs[language]
+
+    def _load(self, language: str) -> NullTranslations:
+        for candidate in _candidates(language):
+            po_path = self.po_dir and Path(self.po_dir) / f"{candidate}.po"
+            if po_path and po_path.exists():
+                mo = compile_mo(parse_po(po_path.read_text(encoding= 'utf-8')))
+                return GNUTranslations(io.BytesIO(mo))
+        if self.domain is None:
+            return NullTranslations()
+        return translation(
+            self.domain, self.mo_dir, _candidates(language), fallback= True
+        )
+
+    def set_language(self, language: Optional[str]= None) -> None:
+        # `None` es el idioma del entorno
+        language = language or environment_language()
+        translations = self.load(language)
+        self.language = language
+        self.translations = translations
+        # Los plurales se repiten mucho con los mismos números
+        self._ngettext = functools.lru_cache(maxsize= 512)(translations.ngettext)
+        for listener in list(self.listeners):
+            listener(language)
+
+    def on_change(self, listener: Callable[[str], None]) -> Callable[[], None]:
+        # Devuelve la función para dejar de escuchar
+        self.listeners.append(listener)
+        return lambda: self.listeners.remove(listener)
+
+    def gettext(self, message: str) -> str:
+        return self.translations.gettext(message)
+
+    def ngettext(self, singular: str, plural: str, n: int) -> str:
+        return self._ngettext(singular, plural, n)
+
+
+translator = Translator()
+
+
+def gettext(message: str) -> str:
+    return translator.gettext(message)
+
+
+def ngettext(singular: str, plural: str, n: int) -> str:
+    return translator.ngettext(singular, plural, n)
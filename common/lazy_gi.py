@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import importlib
+import time
+from types import ModuleType
+
+
+# Lo que comparten las vistas de todos los ejemplos. Cada ejemplo lo
+# importa por su nombre, como sus propios módulos, a través de un
+# enlace simbólico en su directorio.
+
+
+class LazyGiModule:
+    # No importamos Gtk hasta que se usa por primera vez. Así los
+    # presenters se pueden cargar, y medir, sin display.
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.module = None
+
+    def load(self) -> ModuleType:
+        if self.module is None:
+            import gi
+            gi.require_version('Gtk', '4.0')
+            self.module = importlib.import_module(f"gi.repository.{self.name}")
+        return self.module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+
+Gtk = LazyGiModule('Gtk')
+GLib = LazyGiModule('GLib')
+Gio = LazyGiModule('Gio')
+
+
+def quit_after_first_frame(window: Gtk.Window) -> None:
+    # Para medir el arranque (`STARTUP_BENCH`): apunta cuándo se pintó
+    # la ventana por primera vez y sale
+    def on_after_paint(clock, handler_id: list[int]) -> None:
+        clock.disconnect(handler_id[0])
+        print(f"first-frame {time.time()}", flush= True)
+        window.get_application().quit()
+
+    def on_map(window: Gtk.Window) -> None:
+        handler_id = []
+        clock = window.get_frame_clock()
+        handler_id.append(clock.connect('after-paint', on_after_paint, handler_id))
+
+    window.connect('map', on_map)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# Memoria de muchas reservas en un `FlightBookerStore`, frente a la
+# misma lista de `FlightBookerData`, y lo que cuesta recorrerlas:
+#
+#   $ ./bench_booking_store.py --bookings 1000000
+#
+# Las fechas son objetos distintos en cada reserva, como cuando salen
+# de leer un fichero.
+
+import argparse
+import datetime
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from booking_store import FlightBookerStore
+from models import FlightBookerData
+
+
+def sample_bookings(n: int, seed: int= 0) -> list[tuple[bool, int, int]]:
+    # Sólo los ordinales: las fechas se construyen al medir
+    rng = random.Random(seed)
+    first = datetime.date(2025, 1, 1).toordinal()
+    rows = []
+    for _ in range(n):
+        start = first + rng.randrange(365)
+        one_way = rng.random() < 0.5
+        rows.append((one_way, start, 0 if one_way else start + rng.randrange(30)))
+    return rows
+
+
+def bookings(rows: list[tuple[bool, int, int]]):
+    for one_way, start, back in rows:
+        yield FlightBookerData(
+            one_way= one_way,
+            start_date= datetime.datetime.fromordinal(start),
+            return_date= datetime.datetime.fromordinal(back) if back else None
+        )
+
+
+def measure(build) -> tuple[object, int, float]:
+    # Memoria que sigue ocupada después de construirlo, y cuánto tarda
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def best_of(repeat: int, f) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def bench(n: int, repeat: int) -> dict:
+    rows = sample_bookings(n)
+    data, list_bytes, list_build = measure(lambda: list(bookings(rows)))
+    store, store_bytes, store_build = measure(lambda: FlightBookerStore(bookings(rows)))
+    if len(store) != len(data) or list(store[-10:].iter_data()) != data[-10:]:
+        raise AssertionError("FlightBookerStore does not hold the same bookings")
+    one_way_list = best_of(repeat, lambda: sum(1 for d in data if d.one_way))
+    one_way_store = best_of(repeat, lambda: sum(1 for row in store if row.one_way))
+    return {
+        'name': "booking_store",
+        'bookings': n,
+        'list_bytes_per_booking': list_bytes / n,
+        'store_bytes_per_booking': store_bytes / n,
+        'store_nbytes_per_booking': store.nbytes() / n,
+        'memory_ratio': list_bytes / store_bytes,
+        'list_build_s': list_build,
+        'store_build_s': store_build,
+        'list_scan_ms': one_way_list * 1e3,
+        'store_scan_ms': one_way_store * 1e3,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "FlightBookerStore memory benchmark")
+    parser.add_argument('--bookings', type= int, default= 200_000)
+    parser.add_argument('--repeat', type= int, default= 3)
+    parser.add_argument('--output', help= "JSON file, stdout by default")
+    args = parser.parse_args()
+    results = [bench(args.bookings, args.repeat)]
+    if args.output is None:
+        json.dump(results, sys.stdout, indent= 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent= 2)
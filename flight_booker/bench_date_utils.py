@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import datetime
+import locale
+import timeit
+
+import date_utils
+
+
+# Comparamos `parse_date` con `strptime(text, "%x")` en los locales
+# para los que hay traducciones. Sólo se miden los locales instalados.
+LOCALES = {
+    'es': ["es_ES.UTF-8", "es_ES.utf8", "es_ES"],
+    'ar': ["ar_EG.UTF-8", "ar_EG.utf8", "ar_SA.UTF-8", "ar_SA.utf8"],
+    'zh': ["zh_CN.UTF-8", "zh_CN.utf8", "zh_CN"],
+    'C': ["C"],
+}
+N_DATES = 2000
+REPEAT = 5
+
+
+def strptime(text: str):
+    try:
+        return datetime.datetime.strptime(text, "%x")
+    except ValueError:
+        return None
+
+
+def sample_texts() -> list[str]:
+    # Fechas válidas, prefijos (como al teclear) y basura
+    start = datetime.date(2020, 1, 1)
+    texts = []
+    for i in range(N_DATES):
+        text = date_utils.show_date(start + datetime.timedelta(days= i))
+        texts.append(text)
+        texts.append(text[:len(text) // 2])
+        texts.append(text + "x")
+    return texts
+
+
+def bench(parse, texts: list[str]) -> float:
+    return min(
+        timeit.repeat(lambda: [parse(text) for text in texts], number= 1, repeat= REPEAT)
+    ) / len(texts)
+
+
+def bench_locale(name: str) -> None:
+    texts = sample_texts()
+    assert [date_utils.parse_date(text) for text in texts] == [strptime(text) for text in texts]
+    reference = bench(strptime, texts)
+    parser = date_utils.get_parser()
+    uncached = bench(parser.parse, texts)
+    cached = bench(date_utils.parse_date, texts[:date_utils.PARSE_CACHE_SIZE])
+    print(
+        f"{name:12} {str(parser.date_format):12}"
+        f" strptime {reference * 1e6:6.2f}us"
+        f" compiled {uncached * 1e6:6.2f}us (x{reference / uncached:4.1f})"
+        f" cached {cached * 1e6:6.2f}us (x{reference / cached:4.1f})"
+    )
+    bench_completion(name)
+
+
+def bench_completion(name: str) -> None:
+    # Completar lo que se va tecleando, sobre años de fechas
+    t0 = timeit.default_timer()
+    index = date_utils.DateIndex(datetime.date.today(), 10 * 366)
+    build = timeit.default_timer() - t0
+    prefixes = [text[:i] for text in sample_texts()[::3] for i in range(1, len(text) + 1)]
+    lookup = bench(index.complete, prefixes)
+    print(
+        f"{name:12} {len(index.keys)} dates"
+        f" index built in {build * 1e3:5.1f}ms"
+        f" completion {lookup * 1e6:6.2f}us per keystroke"
+    )
+
+
+if __name__ == '__main__':
+    for language, candidates in LOCALES.items():
+        for candidate in candidates:
+            try:
+                locale.setlocale(locale.LC_TIME, candidate)
+            except locale.Error:
+                continue
+            bench_locale(candidate)
+            break
+        else:
+            print(f"{language:12} locale not installed, skipped")
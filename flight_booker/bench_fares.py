@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# La tabla de precios de `fares.py` calculada con numpy, frente a la
+# misma tabla con bucles de Python, y repartida entre procesos:
+#
+#   $ ./bench_fares.py --days 365 --processes 4
+
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+from fares import (
+    SAME_DAY_SURCHARGE,
+    SATURDAY_NIGHT_DISCOUNT,
+    FareCalendar,
+    build_fare_calendar,
+    saturday_nights,
+    simulated_fares
+)
+from flight_schedule import FlightSchedule, random_flights, write_schedule
+
+
+def python_grid(outbound: list[float], inbound: list[float], nights: list[int]) -> list[list[float]]:
+    # Lo mismo que `fare_rows`, casilla a casilla
+    days = len(outbound)
+    grid = []
+    for i in range(days):
+        row = []
+        for j in range(days):
+            if j < i:
+                row.append(float('nan'))
+            elif j == i:
+                row.append(outbound[i] + inbound[j] * SAME_DAY_SURCHARGE)
+            elif nights[j] > nights[i]:
+                row.append(outbound[i] + inbound[j] * SATURDAY_NIGHT_DISCOUNT)
+            else:
+                row.append(outbound[i] + inbound[j])
+        grid.append(row)
+    return grid
+
+
+def best_of(repeat: int, f) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def bench_grid(days: int, repeat: int) -> dict:
+    first = datetime.date(2025, 1, 1)
+    fares = simulated_fares(first, days, first)
+    vectorized = best_of(repeat, lambda: FareCalendar(first, fares, fares))
+    outbound = fares.tolist()
+    nights = saturday_nights(first, days).tolist()
+    python = best_of(1, lambda: python_grid(outbound, outbound, nights))
+    return {
+        'name': "fare_grid",
+        'days': days,
+        'cells': days * days,
+        'numpy_ms': vectorized * 1e3,
+        'python_ms': python * 1e3,
+        'speedup': python / vectorized,
+    }
+
+
+def bench_sharded(days: int, processes: int, repeat: int) -> dict:
+    first = datetime.date(2025, 1, 1)
+    fares = simulated_fares(first, days, first)
+    single = best_of(repeat, lambda: FareCalendar(first, fares, fares))
+    with ProcessPoolExecutor(processes) as executor:
+        # Los procesos ya arrancados, como estarían en la aplicación
+        FareCalendar(first, fares, fares, executor)
+        sharded = best_of(repeat, lambda: FareCalendar(first, fares, fares, executor))
+    return {
+        'name': "fare_grid_sharded",
+        'days': days,
+        'processes': processes,
+        'cpus': os.cpu_count(),
+        'single_ms': single * 1e3,
+        'sharded_ms': sharded * 1e3,
+    }
+
+
+def bench_schedule(days: int, per_day: int, repeat: int) -> dict:
+    # Precios sacados de un horario: el más barato de cada día
+    first = datetime.date(2025, 1, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "schedule.bin")
+        with open(path, 'wb') as f:
+            n = write_schedule(f, random_flights(first, days, per_day))
+        schedule = FlightSchedule(path)
+        elapsed = best_of(repeat, lambda: build_fare_calendar(schedule, first, days))
+        schedule.close()
+    return {
+        'name': "fare_calendar_from_schedule",
+        'days': days,
+        'flights': n,
+        'ms': elapsed * 1e3,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "Fare calendar benchmark")
+    parser.add_argument('--days', type= int, default= 365)
+    parser.add_argument('--per-day', type= int, default= 1000)
+    parser.add_argument('--processes', type= int, default= 4)
+    parser.add_argument('--shard-days', type= int, default= 4000)
+    parser.add_argument('--repeat', type= int, default= 5)
+    parser.add_argument('--output', help= "JSON file, stdout by default")
+    args = parser.parse_args()
+    results = [
+        bench_grid(args.days, args.repeat),
+        bench_sharded(args.shard_days, args.processes, args.repeat),
+        bench_schedule(args.days, args.per_day, args.repeat),
+    ]
+    if args.output is None:
+        json.dump(results, sys.stdout, indent= 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent= 2)
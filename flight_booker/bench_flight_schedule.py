@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# Búsquedas por rango de fechas en un horario grande:
+#
+#   $ ./bench_flight_schedule.py --days 730 --per-day 3000
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from flight_schedule import FlightSchedule, random_flights, write_schedule
+from models import FlightBookerData, FlightBookerModel
+
+
+def bench(days: int, per_day: int, queries: int) -> list[dict]:
+    first = datetime.date(2025, 1, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "schedule.bin")
+        t0 = time.perf_counter()
+        with open(path, 'wb') as f:
+            n = write_schedule(f, random_flights(first, days, per_day))
+        generated = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        schedule = FlightSchedule(path)
+        opened = time.perf_counter() - t0
+        model = FlightBookerModel(schedule= schedule)
+        rng = random.Random(1)
+        searches = []
+        for _ in range(queries):
+            start = first + datetime.timedelta(days= rng.randrange(days))
+            stay = datetime.timedelta(days= rng.randrange(15))
+            searches.append(FlightBookerData(False, start, start + stay))
+
+        t0 = time.perf_counter()
+        found = sum(len(model.find_flights(data)) for data in searches)
+        search = (time.perf_counter() - t0) / queries
+
+        t0 = time.perf_counter()
+        cheapest = [
+            min(flight.price for flight in model.find_flights(data)[:1000])
+            for data in searches[:100]
+        ]
+        decode = (time.perf_counter() - t0) / len(cheapest) / 1000
+        model.executor.shutdown()
+        schedule.close()
+        return [{
+            'name': "flight_schedule",
+            'flights': n,
+            'file_mb': os.path.getsize(path) / 2 ** 20,
+            'generate_s': generated,
+            'open_s': opened,
+            'queries': queries,
+            'mean_flights_per_query': found / queries,
+            'search_ms': search * 1e3,
+            'decode_us_per_flight': decode * 1e6,
+        }]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "Flight schedule search benchmark")
+    parser.add_argument('--days', type= int, default= 730)
+    parser.add_argument('--per-day', type= int, default= 3000)
+    parser.add_argument('--queries', type= int, default= 10000)
+    parser.add_argument('--output', help= "JSON file, stdout by default")
+    args = parser.parse_args()
+    results = bench(args.days, args.per_day, args.queries)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent= 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent= 2)
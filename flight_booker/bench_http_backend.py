@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# Reservas contra el servidor local (`booking_server.py`), con y sin
+# reutilizar las conexiones:
+#
+#   $ ./bench_http_backend.py --bookings 2000 --max-in-flight 8
+#
+# También comprueba que las reservas siguen hechas en el servidor
+# después de que `book_many` termine, y que cancelar mientras se
+# conecta no deja ocupado el sitio de la conexión en el pool.
+
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+import time
+
+from booking_server import BookingServer, start_server
+from http_backend import HttpBackend
+from models import CancellationToken, FlightBookerData, FlightBookerModel, FlightBookerProgress
+
+
+def bench(server: BookingServer, n: int, max_in_flight: int, keep_alive: bool) -> dict:
+    backend = HttpBackend(server.url, max_connections= max_in_flight, keep_alive= keep_alive)
+    model = FlightBookerModel(backend= backend)
+    data = FlightBookerData(one_way= True, start_date= datetime.datetime.today())
+    booked = 0
+    live_before = len(server.bookings)
+    cancelled_before = server.n_cancelled
+    t0 = time.perf_counter()
+    for _index, event in model.book_many((data for _ in range(n)), max_in_flight= max_in_flight):
+        if isinstance(event, FlightBookerData):
+            booked += 1
+        elif not isinstance(event, FlightBookerProgress):
+            raise event
+    elapsed = time.perf_counter() - t0
+    backend.close()
+    model.executor.shutdown()
+    # Terminar `book_many` no debe deshacer lo que ya estaba reservado
+    live = len(server.bookings) - live_before
+    cancelled = server.n_cancelled - cancelled_before
+    if live != booked or cancelled:
+        raise AssertionError(f"{booked} bookings reported, {live} live and {cancelled} cancelled")
+    return {
+        'name': "http_booking",
+        'keep_alive': keep_alive,
+        'bookings': booked,
+        'live_bookings': live,
+        'connections': backend.n_connects,
+        'bookings_per_s': n / elapsed,
+    }
+
+
+class SlowConnectBackend(HttpBackend):
+    # Abrir la conexión tarda, y el worker no se entera de que se ha
+    # cancelado la reserva hasta que termina
+    def __init__(self, url: str, connect_delay: float, **kwargs) -> None:
+        super().__init__(url, **kwargs)
+        self.connect_delay = connect_delay
+
+    def _new_connection(self):
+        time.sleep(self.connect_delay)
+        return super()._new_connection()
+
+
+def free_slots(backend: HttpBackend, max_connections: int) -> int:
+    free = 0
+    while free < max_connections and backend.slots.acquire(blocking= False):
+        free += 1
+    for _ in range(free):
+        backend.slots.release()
+    return free
+
+
+async def cancel_while_connecting(
+        server: BookingServer,
+        n: int,
+        max_connections: int= 2,
+        connect_delay: float= 0.2
+) -> dict:
+    backend = SlowConnectBackend(
+        server.url, connect_delay, max_connections= max_connections, keep_alive= False
+    )
+    model = FlightBookerModel(backend= backend)
+    data = FlightBookerData(one_way= True, start_date= datetime.datetime.today())
+
+    async def book(token: CancellationToken) -> None:
+        async for _step in model.do_book_async(data, token):
+            pass
+
+    for _ in range(n):
+        task = asyncio.create_task(book(CancellationToken()))
+        # Cancela con el worker todavía conectando
+        await asyncio.sleep(connect_delay / 4)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions= True)
+    # Las conexiones que llegan tarde se sueltan al llegar
+    await asyncio.sleep(connect_delay * 2)
+    free = free_slots(backend, max_connections)
+    # Y con todos los sitios libres, la siguiente reserva no se queda
+    # esperando
+    await asyncio.wait_for(book(CancellationToken()), timeout= connect_delay * 10)
+    backend.close()
+    model.executor.shutdown()
+    if free != max_connections:
+        raise AssertionError(f"{free} of {max_connections} connection slots free after cancelling")
+    return {
+        'name': "http_cancel_while_connecting",
+        'cancelled': n,
+        'free_slots': free,
+        'max_connections': max_connections,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "HTTP backend benchmark")
+    parser.add_argument('--bookings', type= int, default= 2000)
+    parser.add_argument('--max-in-flight', type= int, default= 8)
+    args = parser.parse_args()
+    server = start_server()
+    results = [
+        bench(server, args.bookings, args.max_in_flight, keep_alive)
+        for keep_alive in (False, True)
+    ]
+    results.append(asyncio.run(cancel_while_connecting(server, 5)))
+    server.shutdown()
+    json.dump(results, sys.stdout, indent= 2)
+    print()
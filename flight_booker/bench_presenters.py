@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+# Benchmarks del presenter sin Gtk ni display: la vista es una
+# implementación en memoria que sólo cuenta lo que le piden.
+#
+# Los resultados se escriben en JSON para poder compararlos entre
+# versiones:
+#
+#   $ ./bench_presenters.py --output bench.json
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import AsyncIterator, Optional
+
+from date_utils import show_date
+from models import CancellationToken, FlightBookerData, FlightBookerModel, FlightBookerProgress
+from presenters import FlightBookerPresenter, FlightBookerSessions
+from single_flight import SingleFlightMixin
+from views import dispatcher
+
+
+class FakeProgressDialog:
+    def __init__(self, view: FakeView) -> None:
+        self.view = view
+        self.progress = []
+        self.destroyed = False
+
+    def update_progress(self, text: str) -> None:
+        self.progress.append(text)
+
+    def destroy(self) -> None:
+        self.destroyed = True
+
+
+class FakeView:
+    def __init__(self) -> None:
+        self.handler = None
+        self.n_updates = 0
+        self.last_update = None
+        self.dialogs = []
+        self.infos = []
+        self.errors = []
+        self.suggestions = ([], [])
+        self.fares = (None, None)
+
+    def set_handler(self, handler) -> None:
+        self.handler = handler
+
+    def on_activate(self, _app) -> None:
+        self.handler.on_built(self)
+
+    def update(
+            self,
+            start_date_feedback: Optional[tuple[str, str]],
+            return_date_feedback: Optional[tuple[str, str]],
+            return_date_enabled: bool,
+            book_enabled: bool
+    ) -> None:
+        self.n_updates += 1
+        self.last_update = (
+            start_date_feedback,
+            return_date_feedback,
+            return_date_enabled,
+            book_enabled
+        )
+
+    def show_start_date_suggestions(self, suggestions: list[str]) -> None:
+        self.suggestions = (suggestions, self.suggestions[1])
+
+    def show_return_date_suggestions(self, suggestions: list[str]) -> None:
+        self.suggestions = (self.suggestions[0], suggestions)
+
+    def show_fares(self, start_fare: Optional[str], return_fare: Optional[str]) -> None:
+        self.fares = (start_fare, return_fare)
+
+    def retranslate(self) -> None:
+        pass
+
+    def progress_dialog(self, title: str) -> FakeProgressDialog:
+        dialog = FakeProgressDialog(self)
+        self.dialogs.append(dialog)
+        return dialog
+
+    def show_info(self, text: str) -> None:
+        self.infos.append(text)
+
+    def show_error(self, text: str) -> None:
+        self.errors.append(text)
+
+
+class InstantModel(FlightBookerModel):
+    # Un servidor que contesta al momento, para medir sólo lo que
+    # cuesta el presenter
+    async def do_book_async(
+            self,
+            booking_data: FlightBookerData,
+            token: Optional[CancellationToken]= None
+    ) -> AsyncIterator[FlightBookerProgress]:
+        for step in FlightBookerProgress:
+            yield step
+            await asyncio.sleep(0)
+
+
+class PacedModel(FlightBookerModel):
+    # Cada paso tarda un poco, como con un servidor de verdad
+    async def do_book_async(
+            self,
+            booking_data: FlightBookerData,
+            token: Optional[CancellationToken]= None
+    ) -> AsyncIterator[FlightBookerProgress]:
+        for step in FlightBookerProgress:
+            yield step
+            await asyncio.sleep(0.002)
+
+
+class CountingModel(PacedModel):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.n_bookings = 0
+
+    async def do_book_async(
+            self,
+            booking_data: FlightBookerData,
+            token: Optional[CancellationToken]= None
+    ) -> AsyncIterator[FlightBookerProgress]:
+        self.n_bookings += 1
+        async for step in super().do_book_async(booking_data, token):
+            yield step
+
+
+class SingleFlightModel(SingleFlightMixin, CountingModel):
+    pass
+
+
+def build_presenter(model: Optional[FlightBookerModel]= None) -> FlightBookerPresenter:
+    presenter = FlightBookerPresenter(
+        model= model or InstantModel(),
+        view= FakeView(),
+        validation_delay= 0
+    )
+    presenter.view.set_handler(presenter)
+    presenter.view.on_activate(None)
+    return presenter
+
+
+async def wait_validation(presenter: FlightBookerPresenter) -> None:
+    while presenter.pending_validation is not None:
+        await asyncio.sleep(0)
+
+
+async def bench_keystrokes(n: int) -> dict:
+    # Tecleamos fechas carácter a carácter, dejando que el main loop
+    # valide entre ráfagas
+    presenter = build_presenter()
+    start = datetime.date(2024, 1, 1)
+    texts = [show_date(start + datetime.timedelta(days= i)) for i in range(n)]
+    keystrokes = 0
+    t0 = time.perf_counter()
+    for text in texts:
+        for i in range(1, len(text) + 1):
+            presenter.on_start_date_changed(text[:i])
+            keystrokes += 1
+        await wait_validation(presenter)
+    elapsed = time.perf_counter() - t0
+    return {
+        'name': "keystroke_validation",
+        'keystrokes': keystrokes,
+        'validations': presenter.view.n_updates - 1,
+        'keystrokes_per_s': keystrokes / elapsed,
+        'max_feedback_latency_s': presenter.max_feedback_latency,
+    }
+
+
+async def bench_update_view(n: int) -> dict:
+    presenter = build_presenter()
+    presenter.on_flight_type_changed(False)
+    presenter.on_start_date_changed("not a date")
+    await wait_validation(presenter)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        presenter._update_view()
+    elapsed = time.perf_counter() - t0
+    return {
+        'name': "update_view",
+        'calls': n,
+        'us_per_call': elapsed / n * 1e6,
+    }
+
+
+async def bench_booking(n: int) -> dict:
+    presenter = build_presenter()
+    presenter.on_start_date_changed(show_date(datetime.date.today()))
+    await wait_validation(presenter)
+    t0 = time.perf_counter()
+    tasks = []
+    for _ in range(n):
+        presenter.on_book_clicked()
+        tasks.append(presenter.booking)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - t0
+    assert len(presenter.view.infos) + len(presenter.view.errors) == n
+    return {
+        'name': "booking_throughput",
+        'bookings': n,
+        'bookings_per_s': n / elapsed,
+    }
+
+
+async def bench_cancel(n: int) -> dict:
+    # Con el modelo de verdad: el servidor tarda en contestar
+    presenter = build_presenter(FlightBookerModel())
+    presenter.on_start_date_changed(show_date(datetime.date.today()))
+    await wait_validation(presenter)
+    latencies = []
+    for _ in range(n):
+        presenter.on_book_clicked()
+        task = presenter.booking
+        dialog = presenter.view.dialogs[-1]
+        while not dialog.progress:
+            await asyncio.sleep(0)
+        t0 = time.perf_counter()
+        presenter.on_book_cancelled()
+        await asyncio.gather(task, return_exceptions= True)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    return {
+        'name': "cancel_latency",
+        'cancels': n,
+        'median_s': latencies[len(latencies) // 2],
+        'max_s': latencies[-1],
+    }
+
+
+async def bench_progress_flood(n: int) -> dict:
+    # Muchas reservas a la vez actualizando su diálogo: el main loop
+    # sólo debería hacer un callback por frame
+    presenter = build_presenter(PacedModel())
+    presenter.on_start_date_changed(show_date(datetime.date.today()))
+    await wait_validation(presenter)
+    before = dispatcher.stats()
+    t0 = time.perf_counter()
+    tasks = []
+    for _ in range(n):
+        presenter.on_book_clicked()
+        tasks.append(presenter.booking)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - t0
+    after = dispatcher.stats()
+    applied = sum(len(dialog.progress) for dialog in presenter.view.dialogs)
+    return {
+        'name': "progress_flood",
+        'bookings': n,
+        'elapsed_s': elapsed,
+        'updates_posted': after['posted'] - before['posted'],
+        'updates_applied': applied,
+        'main_loop_callbacks': after['flushes'] - before['flushes'],
+        'max_queue_depth': after['max_queue_depth'],
+    }
+
+
+async def bench_sessions(n: int) -> dict:
+    # Abrir `n` ventanas en el mismo proceso, frente a lo que cuesta
+    # un proceso nuevo con una sola
+    sessions = FlightBookerSessions(model= InstantModel(), view_factory= FakeView)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        sessions.open_session(None)
+    elapsed = time.perf_counter() - t0
+    allocated, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len({id(presenter.model.executor) for presenter in sessions.sessions}) == 1
+    for presenter in list(sessions.sessions):
+        presenter.on_closed()
+    assert not sessions.sessions
+    process = subprocess.run(
+        [
+            sys.executable, "-c",
+            "import resource, presenters, bench_presenters;"
+            "bench_presenters.build_presenter();"
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+        ],
+        capture_output= True, text= True, check= True
+    )
+    return {
+        'name': "sessions",
+        'sessions': n,
+        'ms_per_session': elapsed / n * 1e3,
+        'kb_per_session': allocated / n / 1024,
+        'process_per_session_kb': int(process.stdout),
+    }
+
+
+async def bench_duplicate_bookings(n: int) -> dict:
+    # `n` ventanas reservando lo mismo a la vez, y otra vez justo
+    # después: al servidor sólo debería llegar una reserva. Es sólo
+    # ida, aunque en la mitad quedó escrita una fecha de vuelta.
+    results = {'name': "duplicate_bookings", 'bookings': 2 * n}
+    for label, model in (('plain', CountingModel()), ('single_flight', SingleFlightModel())):
+        presenters = [build_presenter(model) for _ in range(n)]
+        for i, presenter in enumerate(presenters):
+            presenter.on_start_date_changed(show_date(datetime.date.today()))
+            if i % 2:
+                presenter.on_return_date_changed(
+                    show_date(datetime.date.today() + datetime.timedelta(days= i))
+                )
+            await wait_validation(presenter)
+        t0 = time.perf_counter()
+        for _round in range(2):
+            tasks = []
+            for presenter in presenters:
+                presenter.on_book_clicked()
+                tasks.append(presenter.booking)
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t0
+        assert all(len(presenter.view.infos) == 2 for presenter in presenters)
+        assert label == 'plain' or model.n_bookings == 1, f"{model.n_bookings} bookings reached the server"
+        results[f'{label}_server_bookings'] = model.n_bookings
+        results[f'{label}_elapsed_s'] = elapsed
+    return results
+
+
+async def main(scale: int) -> list[dict]:
+    return [
+        await bench_keystrokes(100 * scale),
+        await bench_update_view(10000 * scale),
+        await bench_booking(1000 * scale),
+        await bench_cancel(10 * scale),
+        await bench_progress_flood(1000 * scale),
+        await bench_sessions(100 * scale),
+        await bench_duplicate_bookings(100 * scale),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "Headless presenter benchmarks")
+    parser.add_argument('--scale', type= int, default= 1)
+    parser.add_argument('--output', help= "JSON file, stdout by default")
+    args = parser.parse_args()
+    results = asyncio.run(main(args.scale))
+    if args.output is None:
+        json.dump(results, sys.stdout, indent= 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent= 2)
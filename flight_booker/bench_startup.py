@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Cuánto tarda en arrancar la aplicación, desde que se lanza el
+# proceso hasta que la ventana se pinta por primera vez:
+#
+#   $ ./bench_startup.py --runs 10 --output startup.json
+#   $ ./bench_startup.py --script ../helloworld/helloworld.py
+#
+# Con `STARTUP_BENCH` la vista sale en cuanto pinta el primer frame.
+# También se mide lo que cuesta sólo importar los módulos, que no
+# necesita display y se puede seguir aunque no haya Gtk.
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+
+HERE = Path(__file__).parent
+
+
+def time_process(args: list[str], cwd: Path, env: dict[str, str]) -> tuple[float, Optional[float]]:
+    # Devuelve lo que tardó en terminar y, si lo dijo, en pintar
+    t0 = time.time()
+    result = subprocess.run(
+        args, cwd= cwd, env= env, capture_output= True, text= True, timeout= 60
+    )
+    elapsed = time.time() - t0
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1:] or result.returncode)
+    for line in result.stdout.splitlines():
+        if line.startswith("first-frame "):
+            return elapsed, float(line.split()[1]) - t0
+    return elapsed, None
+
+
+def summary(name: str, samples: list[float]) -> dict:
+    return {
+        'name': name,
+        'runs': len(samples),
+        'median_s': statistics.median(samples),
+        'min_s': min(samples),
+        'max_s': max(samples),
+    }
+
+
+def bench_imports(script: Path, runs: int) -> list[dict]:
+    # El intérprete vacío es el mínimo que no podemos bajar
+    env = dict(os.environ)
+    bare = [time_process([sys.executable, "-c", "pass"], script.parent, env)[0] for _ in range(runs)]
+    module = script.stem
+    imports = [
+        time_process([sys.executable, "-c", f"import {module}"], script.parent, env)[0]
+        for _ in range(runs)
+    ]
+    return [summary("interpreter", bare), summary(f"import_{module}", imports)]
+
+
+def bench_first_frame(script: Path, runs: int) -> dict:
+    if not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+        return {'name': "first_frame", 'skipped': "no display"}
+    env = dict(os.environ, STARTUP_BENCH= "1")
+    samples = []
+    for _ in range(runs):
+        try:
+            _elapsed, first_frame = time_process([sys.executable, script.name], script.parent, env)
+        except RuntimeError as e:
+            return {'name': "first_frame", 'skipped': str(e)}
+        if first_frame is None:
+            return {'name': "first_frame", 'skipped': "the window never reported a frame"}
+        samples.append(first_frame)
+    return summary("first_frame", samples)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "Application startup benchmark")
+    parser.add_argument('--script', type= Path, default= HERE / "flight_booker.py")
+    parser.add_argument('--runs', type= int, default= 5)
+    parser.add_argument('--output', help= "JSON file, stdout by default")
+    args = parser.parse_args()
+    script = args.script.resolve()
+    results = bench_imports(script, args.runs) + [bench_first_frame(script, args.runs)]
+    if args.output is None:
+        json.dump(results, sys.stdout, indent= 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent= 2)
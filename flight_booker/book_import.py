@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# Reserva en bloque desde un fichero CSV o JSONL, sin interfaz:
+#
+#   $ ./book_import.py bookings.csv --output results.jsonl --max-in-flight 16
+#
+# Cada fila tiene los campos `one_way`, `start_date` y `return_date`,
+# con las fechas en el formato del locale, igual que en la ventana.
+# Las filas se leen, validan y reservan según van haciendo falta, así
+# que la memoria no depende del tamaño del fichero. Los resultados se
+# escriben, uno por línea, según terminan las reservas.
+
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import json
+import locale
+import sys
+from typing import IO, Iterator, Optional
+
+from date_utils import parse_date
+import metrics
+from models import FlightBookerData, FlightBookerError, FlightBookerModel, FlightBookerProgress
+
+
+TRUE_VALUES = {"1", "true", "yes", "y", "one-way", "one_way"}
+
+
+class DecodedLines:
+    # Las líneas del fichero, decodificadas una a una: una línea que no
+    # está en `encoding` falla sola, y se puede seguir leyendo después
+    def __init__(self, f: IO[bytes], encoding: Optional[str]= None) -> None:
+        self.f = f
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self.line_number = 0
+
+    def __iter__(self) -> DecodedLines:
+        return self
+
+    def __next__(self) -> str:
+        line = next(self.f)
+        self.line_number += 1
+        return line.decode(self.encoding)
+
+
+def read_rows(
+        f: IO[bytes],
+        file_format: str,
+        encoding: Optional[str]= None
+) -> Iterator[dict | ValueError]:
+    # Una línea que no se puede leer sale como el error, con su número
+    # de línea, para que se apunte como inválida en lugar de cortar la
+    # importación
+    lines = DecodedLines(f, encoding)
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except (csv.Error, UnicodeDecodeError) as e:
+                row = ValueError(f"line {lines.line_number}: {e}")
+            yield row
+    elif file_format == 'jsonl':
+        while True:
+            try:
+                line = next(lines)
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+            except StopIteration:
+                return
+            except ValueError as e:
+                row = ValueError(f"line {lines.line_number}: {e}")
+            yield row
+    else:
+        raise ValueError(f"Unknown {file_format=}")
+
+
+def parse_row(row: dict) -> FlightBookerData:
+    # Sin valor, con la celda vacía o sin la columna, es sólo ida, como
+    # al abrir la ventana
+    one_way = row.get('one_way')
+    if isinstance(one_way, str):
+        one_way = one_way.strip().lower()
+        one_way = one_way in TRUE_VALUES if one_way else None
+    if one_way is None:
+        one_way = True
+    return FlightBookerData(
+        one_way= bool(one_way),
+        start_date= parse_date((row.get('start_date') or "").strip()),
+        return_date= parse_date((row.get('return_date') or "").strip())
+    )
+
+
+def import_bookings(
+        rows: Iterator[dict | ValueError],
+        output: IO[str],
+        model: FlightBookerModel,
+        max_in_flight: int
+) -> dict[str, int]:
+    summary = {'booked': 0, 'failed': 0, 'invalid': 0}
+    # Número de fila de cada reserva en marcha, nunca más de
+    # `max_in_flight`
+    in_flight = {}
+
+    def write(row_number: int, status: str, error: str= None) -> None:
+        summary[status] += 1
+        output.write(json.dumps({'row': row_number, 'status': status, 'error': error}) + "\n")
+
+    def valid_bookings() -> Iterator[FlightBookerData]:
+        # Las filas que no son válidas no llegan a reservarse
+        index = 0
+        for row_number, row in enumerate(rows, start= 1):
+            if isinstance(row, ValueError):
+                write(row_number, 'invalid', str(row))
+                continue
+            try:
+                data = parse_row(row)
+            except (AttributeError, TypeError) as e:
+                write(row_number, 'invalid', str(e))
+                continue
+            error = model.validate(data)
+            if error != FlightBookerError.NONE:
+                write(row_number, 'invalid', error.name)
+                continue
+            in_flight[index] = row_number
+            index += 1
+            yield data
+
+    for index, event in model.book_many(valid_bookings(), max_in_flight= max_in_flight):
+        if isinstance(event, FlightBookerProgress):
+            continue
+        row_number = in_flight.pop(index)
+        if isinstance(event, Exception):
+            write(row_number, 'failed', str(event))
+        else:
+            write(row_number, 'booked')
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "Book flights from a CSV or JSONL file")
+    parser.add_argument('input', help= "CSV or JSONL file, - for stdin")
+    parser.add_argument('--format', choices= ['csv', 'jsonl'])
+    parser.add_argument('--output', default= "-", help= "JSONL results, - for stdout")
+    parser.add_argument('--max-in-flight', type= int, default= 8)
+    parser.add_argument('--metrics', help= "Write latency metrics here (.txt or Prometheus)")
+    args = parser.parse_args()
+    if args.max_in_flight < 1:
+        parser.error(f"--max-in-flight must be at least 1, not {args.max_in_flight}")
+
+    # i18n: las fechas vienen en el formato del locale
+    locale.setlocale(locale.LC_ALL, '')
+    file_format = args.format or ('jsonl' if args.input.endswith(".jsonl") else 'csv')
+    # En binario: cada línea se decodifica por separado
+    f_in = sys.stdin.buffer if args.input == "-" else open(args.input, 'rb')
+    f_out = sys.stdout if args.output == "-" else open(args.output, 'w', buffering= 1)
+    with f_in, f_out:
+        summary = import_bookings(
+            read_rows(f_in, file_format),
+            f_out,
+            # Un worker por reserva en marcha, si no el pool del modelo
+            # pondría su propio límite
+            FlightBookerModel(executor= ThreadPoolExecutor(
+                max_workers= args.max_in_flight,
+                thread_name_prefix= "FlightBooker"
+            )),
+            args.max_in_flight
+        )
+    print(json.dumps(summary), file= sys.stderr)
+    if args.metrics:
+        metrics.registry.add_export_hook(metrics.file_exporter(args.metrics))
+        metrics.registry.export()
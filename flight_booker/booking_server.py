@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# Un servidor de reservas de mentira, pero con HTTP de verdad, para
+# poder medir la E/S de las reservas en local:
+#
+#   $ ./booking_server.py --port 8080
+#
+#   POST /bookings        {"one_way": ..., "start_date": ..., "return_date": ...}
+#                         201 {"id": ...} ó 409 {"error": ...}
+#   DELETE /bookings/<id> 204, cancela la reserva. Vale el id de la
+#                         respuesta o la cabecera `Booking-Request-Id`
+#                         de la petición, aunque aún no haya terminado.
+#
+# Las conexiones son persistentes (HTTP/1.1 keep-alive).
+
+from __future__ import annotations
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from typing import Optional
+import uuid
+
+
+class BookingRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo de la respuesta se escriben por separado. Con
+    # Nagle, en una conexión persistente, el cuerpo espera al ACK.
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        if self.path != "/bookings":
+            self.send_json(404, {'error': "Not found"})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            json.loads(self.rfile.read(length))
+        except ValueError:
+            self.send_json(400, {'error': "Malformed booking data"})
+            return
+        request_id = self.headers.get('Booking-Request-Id') or uuid.uuid4().hex
+        time.sleep(random.uniform(0, self.server.answer_delay))
+        if random.random() < self.server.reject_rate:
+            self.send_json(409, {'error': "The server rejected the booking request"})
+            return
+        booking_id = self.server.confirm(request_id)
+        if booking_id is not None:
+            self.send_json(201, {'id': booking_id})
+        else:
+            self.send_json(409, {'error': "The booking was cancelled"})
+
+    def do_DELETE(self) -> None:
+        prefix = "/bookings/"
+        if not self.path.startswith(prefix):
+            self.send_json(404, {'error': "Not found"})
+            return
+        self.server.cancel(self.path[len(prefix):])
+        self.send_response(204)
+        self.send_header('Content-Length', "0")
+        self.end_headers()
+
+    def send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(data)))
+        try:
+            self.end_headers()
+            self.wfile.write(data)
+        except ConnectionError:
+            # El cliente se fue, p.e. porque canceló la reserva
+            self.close_connection = True
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class BookingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address: tuple[str, int]= ("127.0.0.1", 0),
+            answer_delay: float= 0.0,
+            reject_rate: float= 0.0,
+            verbose: bool= False
+    ) -> None:
+        super().__init__(address, BookingRequestHandler)
+        self.answer_delay = answer_delay
+        self.reject_rate = reject_rate
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        # request id -> booking id, y peticiones canceladas
+        self.bookings = {}
+        self.cancelled = set()
+        self.n_cancelled = 0
+
+    def confirm(self, request_id: str) -> Optional[str]:
+        # La misma petición repetida no reserva dos veces. Una petición
+        # cancelada no se puede reservar más.
+        with self.lock:
+            if request_id in self.cancelled:
+                return None
+            if request_id not in self.bookings:
+                self.bookings[request_id] = str(uuid.uuid4())
+            return self.bookings[request_id]
+
+    def cancel(self, booking_or_request_id: str) -> None:
+        with self.lock:
+            self.n_cancelled += 1
+            if self.bookings.pop(booking_or_request_id, None) is None:
+                for request_id, booking_id in self.bookings.items():
+                    if booking_id == booking_or_request_id:
+                        del self.bookings[request_id]
+                        break
+            self.cancelled.add(booking_or_request_id)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_server(**kwargs) -> BookingServer:
+    # Servidor en un thread aparte, para benchmarks y pruebas
+    server = BookingServer(**kwargs)
+    threading.Thread(target= server.serve_forever, daemon= True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "Local booking server stand-in")
+    parser.add_argument('--host', default= "127.0.0.1")
+    parser.add_argument('--port', type= int, default= 8080)
+    parser.add_argument('--answer-delay', type= float, default= 2.0)
+    parser.add_argument('--reject-rate', type= float, default= 0.5)
+    args = parser.parse_args()
+    server = BookingServer(
+        (args.host, args.port),
+        answer_delay= args.answer_delay,
+        reject_rate= args.reject_rate,
+        verbose= True
+    )
+    print(f"Serving on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from array import array
+import datetime
+from typing import Iterable, Iterator, Optional, Union
+
+from models import FlightBookerData
+
+
+# Almacén compacto de muchas `FlightBookerData`. En lugar de una
+# tupla con dos `datetime` por reserva, guardamos cada campo en una
+# columna: un bit por reserva para `one_way` y un int32 con el ordinal
+# del día para cada fecha (0 si no hay fecha). Son unos 8 bytes por
+# reserva.
+#
+# Los slices no copian: comparten las columnas con el almacén del que
+# salen, igual que una vista de numpy.
+
+NO_DATE = 0
+
+
+def _to_ordinal(date: Optional[datetime.datetime]) -> int:
+    return NO_DATE if date is None else date.toordinal()
+
+
+def _from_ordinal(ordinal: int) -> Optional[datetime.datetime]:
+    return None if ordinal == NO_DATE else datetime.datetime.fromordinal(ordinal)
+
+
+class FlightBookerRow:
+    # Vista de una fila, sin copiar sus datos
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store: FlightBookerStore, index: int) -> None:
+        self.store = store
+        self.index = index
+
+    @property
+    def one_way(self) -> bool:
+        return self.store._get_one_way(self.index)
+
+    @property
+    def start_date(self) -> Optional[datetime.datetime]:
+        return _from_ordinal(self.store._start[self.index])
+
+    @property
+    def return_date(self) -> Optional[datetime.datetime]:
+        return _from_ordinal(self.store._return[self.index])
+
+    def to_data(self) -> FlightBookerData:
+        return FlightBookerData(self.one_way, self.start_date, self.return_date)
+
+    def __repr__(self) -> str:
+        return f"FlightBookerRow({self.index}, {self.to_data()!r})"
+
+
+class FlightBookerStore:
+    __slots__ = ('_flags', '_start', '_return', '_offset', '_length', '_is_view')
+
+    def __init__(self, bookings: Iterable[FlightBookerData]= ()) -> None:
+        self._flags = bytearray()
+        self._start = array('i')
+        self._return = array('i')
+        # Para los slices: la parte de las columnas que nos toca
+        self._offset = 0
+        self._length = 0
+        self._is_view = False
+        self.extend(bookings)
+
+    def append(self, data: FlightBookerData) -> None:
+        if self._is_view:
+            raise TypeError("Can't append to a slice of a FlightBookerStore")
+        index = self._length
+        if index % 8 == 0:
+            self._flags.append(0)
+        if data.one_way:
+            self._flags[index >> 3] |= 1 << (index & 7)
+        self._start.append(_to_ordinal(data.start_date))
+        self._return.append(_to_ordinal(data.return_date))
+        self._length += 1
+
+    def extend(self, bookings: Iterable[FlightBookerData]) -> None:
+        for data in bookings:
+            self.append(data)
+
+    def _get_one_way(self, index: int) -> bool:
+        return bool(self._flags[index >> 3] & (1 << (index & 7)))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[FlightBookerRow, FlightBookerStore]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            if step != 1:
+                raise ValueError("FlightBookerStore slices must be contiguous")
+            view = FlightBookerStore.__new__(FlightBookerStore)
+            view._flags = self._flags
+            view._start = self._start
+            view._return = self._return
+            view._offset = self._offset + start
+            view._length = max(0, stop - start)
+            view._is_view = True
+            return view
+        if key < 0:
+            key += self._length
+        if not 0 <= key < self._length:
+            raise IndexError("FlightBookerStore index out of range")
+        return FlightBookerRow(self, self._offset + key)
+
+    def __iter__(self) -> Iterator[FlightBookerRow]:
+        for index in range(self._offset, self._offset + self._length):
+            yield FlightBookerRow(self, index)
+
+    def iter_data(self) -> Iterator[FlightBookerData]:
+        for row in self:
+            yield row.to_data()
+
+    def nbytes(self) -> int:
+        # Lo que ocupan sus filas en las columnas, sin contar los
+        # objetos Python. En un slice, sólo su parte, aunque comparta
+        # las columnas enteras.
+        start, stop = self._offset, self._offset + self._length
+        flag_bytes = (stop + 7 >> 3) - (start >> 3) if self._length else 0
+        return (
+            flag_bytes +
+            self._start.itemsize * self._length +
+            self._return.itemsize * self._length
+        )
@@ -1,19 +1,173 @@
+import bisect
 import datetime
+import functools
+import locale
+import re
 from typing import Optional
 
 
+# `strptime` vuelve a resolver el formato `%x` del locale y su
+# expresión regular en cada llamada. Como el formato sólo cambia si
+# cambia el locale, lo compilamos una vez por locale y, además,
+# guardamos los resultados de las últimas entradas.
+
+PARSE_CACHE_SIZE = 1024
+# Días, a partir de hoy, que se ofrecen al completar una fecha
+COMPLETION_DAYS = 3 * 366
+
+
+# Las mismas expresiones que usa `strptime` para cada directiva. La
+# segunda es la que acepta un prefijo de un valor válido.
+_DIRECTIVES = {
+    'd': (r"(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])", r"[0-3 ]?"),
+    'm': (r"(?P<m>1[0-2]|0[1-9]|[1-9])", r"[01]?"),
+    'y': (r"(?P<y>\d\d)", r"\d?"),
+    'Y': (r"(?P<Y>\d\d\d\d)", r"\d{0,3}"),
+}
+
+
+def _locale_date_format() -> Optional[str]:
+    # Igual que hace `strptime` por dentro: formateamos una fecha
+    # conocida y cambiamos cada valor por su directiva. Si con otras
+    # fechas no sale lo mismo, es que el formato lleva nombres de
+    # meses, días, ... y no sabemos compilarlo.
+    text = datetime.date(1999, 3, 17).strftime("%x").replace("%", "%%")
+    for value, directive in (
+            ("1999", "%Y"),
+            ("99", "%y"),
+            ("17", "%d"),
+            ("03", "%m"),
+            ("3", "%m"),
+    ):
+        text = text.replace(value, directive, 1)
+    for date in (datetime.date(2004, 11, 28), datetime.date(2010, 6, 5)):
+        if date.strftime(text) != date.strftime("%x"):
+            return None
+    return text
+
+
+class DateParser:
+    def __init__(self, date_format: Optional[str]) -> None:
+        # Sin formato compilable usamos `strptime` con el formato del
+        # locale ya resuelto
+        self.date_format = date_format
+        self.regex = None
+        self.prefix_regex = None
+        if date_format is not None:
+            tokens = [
+                _DIRECTIVES[part[1]] if part.startswith("%") and part != "%%"
+                else (r"\s+", "") if part.isspace()
+                else (re.escape(part[-1]), "")
+                for part in re.findall(r"%.|\s+|.", date_format, re.DOTALL)
+            ]
+            self.regex = re.compile(
+                "".join(full for full, _partial in tokens),
+                re.IGNORECASE
+            )
+            # Un prefijo válido es un token completo seguido de un
+            # prefijo del resto, o un prefijo del token
+            full, partial = tokens[-1]
+            prefix = f"(?:{full}|{partial})"
+            for full, partial in reversed(tokens[:-1]):
+                prefix = f"(?:{full}{prefix}|{partial})"
+            self.prefix_regex = re.compile(prefix, re.IGNORECASE)
+
+    def parse(self, text: str) -> Optional[datetime.datetime]:
+        if self.regex is None:
+            try:
+                return datetime.datetime.strptime(text, "%x")
+            except ValueError:
+                return None
+        match = self.regex.fullmatch(text)
+        if match is None:
+            return None
+        fields = match.groupdict()
+        if fields.get('Y') is not None:
+            year = int(fields['Y'])
+        else:
+            year = int(fields.get('y') or 0)
+            year += 2000 if year <= 68 else 1900
+        try:
+            return datetime.datetime(year, int(fields['m']), int(fields['d']))
+        except ValueError:
+            # p.e. 31 de febrero
+            return None
+
+    def is_prefix(self, text: str) -> bool:
+        # ¿ Se puede llegar a una fecha válida escribiendo más ?
+        if self.prefix_regex is None:
+            return True
+        return self.prefix_regex.fullmatch(text) is not None
+
+
+@functools.lru_cache(maxsize= None)
+def _parser_for(locale_name: str) -> DateParser:
+    return DateParser(_locale_date_format())
+
+
+def get_parser() -> DateParser:
+    return _parser_for(locale.setlocale(locale.LC_TIME))
+
+
+@functools.lru_cache(maxsize= PARSE_CACHE_SIZE)
+def _parse_date(locale_name: str, text: str) -> Optional[datetime.datetime]:
+    return _parser_for(locale_name).parse(text)
+
+
 def parse_date(text: str) -> Optional[datetime.datetime]:
-    try:
-        # i18n: el formato de fecha es el que marca el locale
-        date = datetime.datetime.strptime(text, "%x")
-    except ValueError:
-        date = None
-    return date
-
-    
+    # i18n: el formato de fecha es el que marca el locale
+    return _parse_date(locale.setlocale(locale.LC_TIME), text)
+
+
+def is_date_prefix(text: str) -> bool:
+    return get_parser().is_prefix(text)
+
+
 def show_date(date: datetime.datetime) -> str:
     # i18n: el formato de fecha es el que marca el locale
     return date.strftime("%x")
 
 
+class DateIndex:
+    # Todas las fechas de un rango tal y como se escriben en el locale,
+    # ordenadas como texto. Las que empiezan por lo mismo quedan
+    # juntas, así que completar es una búsqueda binaria.
+    def __init__(self, first: datetime.date, days: int) -> None:
+        entries = sorted(
+            (text.casefold(), text)
+            for text in (show_date(first + datetime.timedelta(days= i)) for i in range(days))
+        )
+        self.keys = [key for key, _text in entries]
+        self.texts = [text for _key, text in entries]
+
+    def complete(self, prefix: str, limit: int= 5) -> list[str]:
+        prefix = prefix.casefold()
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.keys, prefix)
+        end = min(start + limit, len(self.keys))
+        return [
+            self.texts[i] for i in range(start, end)
+            if self.keys[i].startswith(prefix)
+        ]
+
+
+@functools.lru_cache(maxsize= 4)
+def _index_for(locale_name: str, first: datetime.date, days: int) -> DateIndex:
+    return DateIndex(first, days)
+
+
+def get_date_index() -> DateIndex:
+    return _index_for(
+        locale.setlocale(locale.LC_TIME),
+        datetime.date.today(),
+        COMPLETION_DAYS
+    )
+
+
+def complete_date(text: str, limit: int= 5) -> list[str]:
+    # Fechas desde hoy que empiezan por `text`
+    return get_date_index().complete(text.strip(), limit)
+
+
 date_sample = datetime.datetime.today()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from collections import Counter
+import gc
+import sys
+import threading
+import tracemalloc
+from typing import Optional
+import weakref
+
+
+# Modo diagnóstico para buscar fugas de memoria. Con `tracker`
+# activado, el presenter apunta con referencias débiles lo que crea
+# en cada reserva (la tarea, el token, el diálogo) y él mismo. Lo que
+# siga vivo cuando ya debería haberse liberado es una fuga: algo
+# todavía lo referencia.
+#
+# Desactivado no cuesta nada más que comprobar `enabled`.
+#
+#   $ FLIGHT_BOOKER_DIAGNOSTICS=leaks.txt ./flight_booker.py
+#   $ ./leak_check.py --cycles 500
+
+
+class LeakTracker:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.objects = {}
+        self.n_tracked = Counter()
+
+    def enable(self, frames: int= 1) -> None:
+        self.enabled = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def disable(self) -> None:
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def track(self, kind: str, obj: object) -> None:
+        if not self.enabled:
+            return
+        self.objects.setdefault(kind, weakref.WeakSet()).add(obj)
+        self.n_tracked[kind] += 1
+
+    def alive(self) -> dict[str, int]:
+        # Antes de contar hay que recoger los ciclos, si no parecen
+        # vivos objetos que ya no usa nadie
+        gc.collect()
+        return {kind: len(objects) for kind, objects in self.objects.items()}
+
+    def referrers(self, kind: str, limit: int= 3) -> list[str]:
+        # Quién sujeta los que siguen vivos, para saber por dónde tirar
+        if kind not in self.objects:
+            return []
+        lines = []
+        objects = list(self.objects[kind])[:limit]
+        ignored = (objects, self.objects[kind].data, sys._getframe())
+        for obj in objects:
+            for referrer in gc.get_referrers(obj):
+                if not any(referrer is ignore for ignore in ignored):
+                    lines.append(f"{type(obj).__name__} <- {type(referrer).__name__}: {repr(referrer)[:100]}")
+        return lines
+
+    def threads(self) -> list[str]:
+        return sorted(
+            thread.name for thread in threading.enumerate()
+            if thread is not threading.main_thread()
+        )
+
+    def snapshot(self) -> Optional[tracemalloc.Snapshot]:
+        if not tracemalloc.is_tracing():
+            return None
+        gc.collect()
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+
+    def report(self, since: Optional[tracemalloc.Snapshot]= None, limit: int= 10) -> str:
+        lines = ["Tracked objects (alive / total):"]
+        alive = self.alive()
+        for kind in sorted(self.objects):
+            lines.append(f"  {kind}: {alive[kind]} / {self.n_tracked[kind]}")
+        threads = self.threads()
+        lines.append(f"Threads: {len(threads)} {', '.join(threads)}")
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"Traced memory: {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)")
+            if since is None:
+                lines.append("Top allocations:")
+                stats = snapshot.statistics('lineno')[:limit]
+            else:
+                lines.append("Top growth:")
+                stats = snapshot.compare_to(since, 'lineno')[:limit]
+            lines.extend(f"  {stat}" for stat in stats)
+        return "\n".join(lines)
+
+
+tracker = LeakTracker()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+# Calendario de precios: lo que cuesta el viaje para cada pareja
+# (fecha de ida, fecha de vuelta) de una ventana de días. Se calcula
+# la tabla entera de una vez con numpy, sin un bucle de Python por
+# casilla: 365×365 son unos pocos milisegundos.
+#
+# El precio de cada día es el del vuelo más barato de ese día en el
+# horario (`flight_schedule.py`) o, si no hay horario, una tarifa
+# simulada que sube según se acerca la fecha. Sobre eso:
+#   - Volver el mismo día es más caro
+#   - Pasar la noche del sábado fuera es más barato
+#
+# Con ventanas muy grandes, las filas de la tabla se pueden repartir
+# entre varios procesos.
+#
+#   $ ./fares.py --days 365 --start 2025-03-01
+
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import Executor
+import datetime
+import functools
+import time
+from typing import TYPE_CHECKING, Optional
+
+from flight_schedule import FlightSchedule
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Días, a partir de hoy, que cubre el calendario
+FARE_DAYS = 365
+SAME_DAY_SURCHARGE = 1.25
+SATURDAY_NIGHT_DISCOUNT = 0.85
+# Más o menos demanda según el día de la semana, de lunes a domingo
+WEEKDAY_DEMAND = (1.0, 0.9, 0.9, 1.0, 1.3, 1.1, 1.35)
+# A partir de aquí compensa repartir la tabla entre procesos
+SHARD_ROWS = 1024
+
+
+def simulated_fares(first: datetime.date, days: int, today: datetime.date) -> np.ndarray:
+    # En céntimos. Más barato cuanto antes se reserva, y según el día
+    # de la semana.
+    import numpy as np
+
+    ahead = np.arange(days) + (first - today).days
+    weekday = (first.weekday() + np.arange(days)) % 7
+    fares = (4000 + 9000 * np.exp(-np.maximum(ahead, 0) / 21)) * np.take(WEEKDAY_DEMAND, weekday)
+    fares[ahead < 0] = np.nan
+    return fares.astype(np.float32)
+
+
+def schedule_fares(
+        schedule: FlightSchedule,
+        first: datetime.date,
+        days: int,
+        origin: Optional[str]= None,
+        destination: Optional[str]= None
+) -> np.ndarray:
+    # El vuelo más barato con plazas de cada día, NaN si no hay ninguno
+    import numpy as np
+
+    last = first + datetime.timedelta(days= days - 1)
+    flights = schedule.between(first, last).as_array()
+    keep = flights['seats'] > 0
+    if origin:
+        keep &= flights['origin'] == origin.encode('ascii')
+    if destination:
+        keep &= flights['destination'] == destination.encode('ascii')
+    flights = flights[keep]
+    fares = np.full(days, np.nan, dtype= np.float32)
+    if len(flights):
+        # Ya vienen ordenados por fecha: cada día es un tramo seguido
+        day = flights['date'] - first.toordinal()
+        present, starts = np.unique(day, return_index= True)
+        fares[present] = np.minimum.reduceat(flights['price'], starts)
+    return fares
+
+
+def saturday_nights(first: datetime.date, days: int) -> np.ndarray:
+    # Cuántas noches de sábado hay antes de cada día: entre la ida `i`
+    # y la vuelta `j` hay `nights[j] - nights[i]`
+    import numpy as np
+
+    saturday = (first.weekday() + np.arange(days)) % 7 == 5
+    return np.concatenate(([0], np.cumsum(saturday)[:-1]))
+
+
+def fare_rows(
+        outbound: np.ndarray,
+        inbound: np.ndarray,
+        nights: np.ndarray,
+        row_start: int,
+        row_stop: int,
+        out: Optional[np.ndarray]= None
+) -> np.ndarray:
+    # Las filas `row_start:row_stop` de la tabla. Las casillas con la
+    # vuelta antes de la ida, o sin vuelo algún día, son NaN.
+    import numpy as np
+
+    discount = np.where(
+        nights[None, :] > nights[row_start:row_stop, None],
+        np.float32(SATURDAY_NIGHT_DISCOUNT),
+        np.float32(1.0)
+    )
+    grid = np.multiply(inbound[None, :], discount, out= out)
+    grid += outbound[row_start:row_stop, None]
+    grid[np.arange(len(inbound))[None, :] < np.arange(row_start, row_stop)[:, None]] = np.nan
+    # La diagonal es volver el mismo día
+    rows = np.arange(row_start, row_stop)
+    grid[rows - row_start, rows] = outbound[rows] + inbound[rows] * np.float32(SAME_DAY_SURCHARGE)
+    return grid
+
+
+def _mapped_fare_rows(
+        path: str,
+        outbound: np.ndarray,
+        inbound: np.ndarray,
+        nights: np.ndarray,
+        row_start: int,
+        row_stop: int
+) -> None:
+    # En otro proceso: escribe sus filas directamente en la tabla, un
+    # fichero mapeado en memoria, en lugar de devolverlas serializadas
+    import numpy as np
+
+    days = len(inbound)
+    grid = np.memmap(path, dtype= np.float32, mode= 'r+', shape= (days, days))
+    fare_rows(outbound, inbound, nights, row_start, row_stop, out= grid[row_start:row_stop])
+    grid.flush()
+    del grid
+
+
+def fare_grid(
+        first: datetime.date,
+        outbound: np.ndarray,
+        inbound: np.ndarray,
+        executor: Optional[Executor]= None,
+        shard_rows: int= SHARD_ROWS
+) -> np.ndarray:
+    # Con `executor` (un `ProcessPoolExecutor`), cada trozo de
+    # `shard_rows` filas se calcula en un proceso. Todos escriben en
+    # la misma tabla, mapeada desde un fichero temporal. Para ventanas
+    # pequeñas no merece la pena arrancar el trabajo en otros procesos.
+    import numpy as np
+
+    days = len(outbound)
+    outbound = np.asarray(outbound, dtype= np.float32)
+    inbound = np.asarray(inbound, dtype= np.float32)
+    nights = saturday_nights(first, days)
+    if executor is None or days <= shard_rows:
+        return fare_rows(outbound, inbound, nights, 0, days)
+    # Sólo aquí, para no cargarlo al arrancar la aplicación
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(prefix= "fares-") as f:
+        f.truncate(days * days * 4)
+        shards = [
+            executor.submit(
+                _mapped_fare_rows, f.name, outbound, inbound, nights,
+                start, min(start + shard_rows, days)
+            )
+            for start in range(0, days, shard_rows)
+        ]
+        for shard in shards:
+            shard.result()
+        return np.fromfile(f.name, dtype= np.float32).reshape(days, days)
+
+
+class FareCalendar:
+    def __init__(
+            self,
+            first: datetime.date,
+            outbound: np.ndarray,
+            inbound: np.ndarray,
+            executor: Optional[Executor]= None
+    ) -> None:
+        import numpy as np
+
+        self.first = first
+        self.days = len(outbound)
+        self.outbound = outbound
+        self.grid = fare_grid(first, outbound, inbound, executor)
+        # `fmin` se salta los NaN, y no avisa si toda la fila lo es
+        self.cheapest_return = np.fmin.reduce(self.grid, axis= 1)
+
+    def _day(self, date: datetime.date) -> Optional[int]:
+        day = date.toordinal() - self.first.toordinal()
+        return day if 0 <= day < self.days else None
+
+    def _cents(self, value) -> Optional[int]:
+        return None if value != value else int(round(float(value)))
+
+    def one_way(self, start: datetime.date) -> Optional[int]:
+        day = self._day(start)
+        return None if day is None else self._cents(self.outbound[day])
+
+    def round_trip(self, start: datetime.date, back: datetime.date) -> Optional[int]:
+        i, j = self._day(start), self._day(back)
+        return None if i is None or j is None else self._cents(self.grid[i, j])
+
+    def cheapest_from(self, start: datetime.date) -> Optional[int]:
+        # La vuelta más barata saliendo ese día
+        day = self._day(start)
+        return None if day is None else self._cents(self.cheapest_return[day])
+
+
+def build_fare_calendar(
+        schedule: Optional[FlightSchedule],
+        first: datetime.date,
+        days: int,
+        executor: Optional[Executor]= None
+) -> FareCalendar:
+    if schedule is None:
+        fares = simulated_fares(first, days, first)
+        return FareCalendar(first, fares, fares, executor)
+    fares = schedule_fares(schedule, first, days)
+    return FareCalendar(first, fares, fares, executor)
+
+
+@functools.lru_cache(maxsize= 4)
+def _calendar_for(schedule: Optional[FlightSchedule], first: datetime.date, days: int) -> FareCalendar:
+    return build_fare_calendar(schedule, first, days)
+
+
+def get_fare_calendar(schedule: Optional[FlightSchedule]= None) -> Optional[FareCalendar]:
+    # Uno por día y horario, compartido por todas las ventanas. Sin
+    # numpy no hay precios, pero se puede reservar igual.
+    try:
+        return _calendar_for(schedule, datetime.date.today(), FARE_DAYS)
+    except ImportError:
+        return None
+
+
+if __name__ == '__main__':
+    from concurrent.futures import ProcessPoolExecutor
+
+    parser = argparse.ArgumentParser(description= "Fare calendar")
+    parser.add_argument('--schedule', help= "flight schedule file, simulated fares by default")
+    parser.add_argument('--first', type= datetime.date.fromisoformat, default= datetime.date.today())
+    parser.add_argument('--days', type= int, default= FARE_DAYS)
+    parser.add_argument('--processes', type= int, default= 0, help= "shard the grid between processes")
+    parser.add_argument('--start', type= datetime.date.fromisoformat, help= "show the fares from this day")
+    args = parser.parse_args()
+
+    schedule = FlightSchedule(args.schedule) if args.schedule else None
+    executor = ProcessPoolExecutor(args.processes) if args.processes else None
+    t0 = time.perf_counter()
+    calendar = build_fare_calendar(schedule, args.first, args.days, executor)
+    elapsed = time.perf_counter() - t0
+    print(f"{args.days}x{args.days} fares in {elapsed * 1e3:.1f} ms")
+    if args.start is not None:
+        for back in range(7):
+            date = args.start + datetime.timedelta(days= back)
+            fare = calendar.round_trip(args.start, date)
+            print(f"{args.start} - {date}: {'-' if fare is None else f'{fare / 100:.2f}'}")
+    if executor is not None:
+        executor.shutdown()
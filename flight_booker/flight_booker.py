@@ -1,12 +1,18 @@
 #!/usr/bin/env python3
 
+import atexit
 import locale
-import gettext
+import os
 from pathlib import Path
 
-from models import FlightBookerModel
+from diagnostics import tracker
+from flight_schedule import FlightSchedule
+from i18n import translator
+import metrics
 from views import FlightBookerView
-from presenters import FlightBookerPresenter
+from presenters import FlightBookerSessions
+from resilience import RetryPolicy
+from single_flight import SingleFlightFlightBookerModel
 
 
 # Los formularios enseguida tienden a proporcionar una mala
@@ -26,10 +32,33 @@ if __name__ == '__main__':
     locale.setlocale(locale.LC_ALL, '')
     LOCALE_DIR = Path(__file__).parent / "locale"
     locale.bindtextdomain('FlightBooker', LOCALE_DIR)
-    gettext.bindtextdomain('FlightBooker', LOCALE_DIR)
-    gettext.textdomain('FlightBooker')
+    # Busca LOCALE_DIR/<idioma>.po, o si no el .mo instalado
+    translator.configure('FlightBooker', po_dir= LOCALE_DIR, mo_dir= LOCALE_DIR)
 
-    FlightBookerPresenter(
-        model= FlightBookerModel(),
-        view= FlightBookerView()
+    # FLIGHT_BOOKER_METRICS=metrics.prom vuelca las métricas al salir
+    metrics_path = os.environ.get('FLIGHT_BOOKER_METRICS')
+    if metrics_path:
+        metrics.registry.add_export_hook(metrics.file_exporter(metrics_path))
+        atexit.register(metrics.registry.export)
+
+    # FLIGHT_BOOKER_DIAGNOSTICS=leaks.txt apunta lo que se crea en
+    # cada reserva y al salir escribe lo que sigue vivo
+    diagnostics_path = os.environ.get('FLIGHT_BOOKER_DIAGNOSTICS')
+    if diagnostics_path:
+        tracker.enable()
+        atexit.register(lambda: Path(diagnostics_path).write_text(tracker.report() + "\n"))
+
+    # FLIGHT_BOOKER_SCHEDULE=schedule.bin, ver `flight_schedule.py`
+    schedule_path = os.environ.get('FLIGHT_BOOKER_SCHEDULE')
+    schedule = FlightSchedule(schedule_path) if schedule_path else None
+
+    # Cada ventana (Ctrl+N, o lanzar otra vez la aplicación) es una
+    # sesión de reserva. Todas comparten este modelo, así que una
+    # reserva repetida desde otra ventana no se vuelve a hacer.
+    FlightBookerSessions(
+        model= SingleFlightFlightBookerModel(
+            policy= RetryPolicy(max_attempts= 3),
+            schedule= schedule
+        ),
+        view_factory= FlightBookerView
     ).run(application_id= "es.udc.fic.ipm.FlightBooker")
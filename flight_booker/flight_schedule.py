@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+# Horario de vuelos en un fichero local de registros de tamaño fijo,
+# ordenados por fecha. El fichero se mapea en memoria y las búsquedas
+# por rango de fechas son búsquedas binarias sobre el propio fichero:
+# no se carga nada en objetos de Python hasta que se recorre el
+# resultado, así que vale igual con millones de vuelos.
+#
+#   $ ./flight_schedule.py generate schedule.bin --days 730 --per-day 3000
+#   $ ./flight_schedule.py search schedule.bin 2025-03-01 2025-03-08
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import datetime
+import mmap
+import random
+import struct
+import sys
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+MAGIC = b"FLIGHTS1"
+# magic, tamaño del registro, nº de registros
+HEADER = struct.Struct("<8sII")
+# fecha (ordinal), salida (minuto del día), vuelo, origen, destino,
+# plazas libres, precio (céntimos)
+RECORD = struct.Struct("<iH8s3s3sHI")
+ORIGIN_AT = struct.calcsize("<iH8s")
+
+AIRPORTS = ("LCG", "SCQ", "VGO", "MAD", "BCN", "LIS", "CDG", "LHR", "FRA", "AMS")
+
+
+class Flight(NamedTuple):
+    date: datetime.date
+    departure: datetime.time
+    number: str
+    origin: str
+    destination: str
+    seats: int
+    price: int
+
+
+def _pack(flight: Flight) -> bytes:
+    return RECORD.pack(
+        flight.date.toordinal(),
+        flight.departure.hour * 60 + flight.departure.minute,
+        flight.number.encode('ascii'),
+        flight.origin.encode('ascii'),
+        flight.destination.encode('ascii'),
+        flight.seats,
+        flight.price
+    )
+
+
+def _unpack(buffer, offset: int) -> Flight:
+    ordinal, minute, number, origin, destination, seats, price = RECORD.unpack_from(buffer, offset)
+    return Flight(
+        datetime.date.fromordinal(ordinal),
+        datetime.time(minute // 60, minute % 60),
+        number.rstrip(b"\0").decode('ascii'),
+        origin.decode('ascii'),
+        destination.decode('ascii'),
+        seats,
+        price
+    )
+
+
+class _DateColumn:
+    # Las fechas de los registros como una secuencia, para `bisect`.
+    # Sólo se lee la fecha de los registros que visita la búsqueda.
+    def __init__(self, buffer, count: int) -> None:
+        self.buffer = buffer
+        self.count = count
+        self.unpack = struct.Struct("<i").unpack_from
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> int:
+        return self.unpack(self.buffer, HEADER.size + i * RECORD.size)[0]
+
+
+class FlightRange:
+    # Un trozo del horario. Los vuelos se decodifican al recorrerlo.
+    def __init__(self, schedule: FlightSchedule, start: int, stop: int) -> None:
+        self.schedule = schedule
+        self.start = start
+        self.stop = stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, i: int | slice) -> Flight | FlightRange:
+        if isinstance(i, slice):
+            indices = range(self.start, self.stop)[i]
+            if indices.step != 1:
+                raise ValueError("Only contiguous slices of flights")
+            return FlightRange(self.schedule, indices.start, max(indices.start, indices.stop))
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return self.schedule.record(self.start + i % len(self))
+
+    def __iter__(self) -> Iterator[Flight]:
+        for i in range(self.start, self.stop):
+            yield self.schedule.record(i)
+
+    def as_array(self) -> np.ndarray:
+        # Los registros como un array estructurado de numpy, sin copiar
+        # nada: es una vista del propio fichero
+        import numpy as np
+
+        dtype = np.dtype([
+            ('date', '<i4'),
+            ('minute', '<u2'),
+            ('number', 'S8'),
+            ('origin', 'S3'),
+            ('destination', 'S3'),
+            ('seats', '<u2'),
+            ('price', '<u4'),
+        ])
+        return np.frombuffer(
+            self.schedule.buffer,
+            dtype= dtype,
+            count= len(self),
+            offset= HEADER.size + self.start * RECORD.size
+        )
+
+    def filter(
+            self,
+            origin: Optional[str]= None,
+            destination: Optional[str]= None
+    ) -> Iterator[Flight]:
+        # Se comparan los bytes del registro, sin decodificar los que
+        # no coinciden
+        origin_bytes = origin.encode('ascii') if origin else None
+        destination_bytes = destination.encode('ascii') if destination else None
+        buffer = self.schedule.buffer
+        for i in range(self.start, self.stop):
+            offset = HEADER.size + i * RECORD.size
+            origin_at = offset + ORIGIN_AT
+            if origin_bytes and buffer[origin_at:origin_at + 3] != origin_bytes:
+                continue
+            if destination_bytes and buffer[origin_at + 3:origin_at + 6] != destination_bytes:
+                continue
+            yield _unpack(buffer, offset)
+
+
+class FlightSchedule:
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access= mmap.ACCESS_READ)
+        magic, record_size, count = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or record_size != RECORD.size:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a flight schedule")
+        if len(self.buffer) < HEADER.size + count * RECORD.size:
+            self.buffer.close()
+            raise ValueError(f"{path} is truncated")
+        self.count = count
+        self.dates = _DateColumn(self.buffer, count)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, i: int) -> Flight:
+        return _unpack(self.buffer, HEADER.size + i * RECORD.size)
+
+    def between(self, first: datetime.date, last: datetime.date) -> FlightRange:
+        # Los vuelos desde `first` hasta `last`, los dos incluidos
+        start = bisect.bisect_left(self.dates, first.toordinal())
+        stop = bisect.bisect_right(self.dates, last.toordinal(), lo= start)
+        return FlightRange(self, start, stop)
+
+    def on(self, date: datetime.date) -> FlightRange:
+        return self.between(date, date)
+
+    def close(self) -> None:
+        self.buffer.close()
+
+
+def write_schedule(f: IO[bytes], flights: Iterable[Flight]) -> int:
+    # Los vuelos tienen que llegar ordenados por fecha. El número de
+    # registros se escribe al final, así no hace falta tenerlos todos.
+    f.write(HEADER.pack(MAGIC, RECORD.size, 0))
+    count = 0
+    last_date = None
+    for flight in flights:
+        if last_date is not None and flight.date < last_date:
+            raise ValueError(f"Flights are not sorted by date: {flight}")
+        last_date = flight.date
+        f.write(_pack(flight))
+        count += 1
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, RECORD.size, count))
+    return count
+
+
+def random_flights(
+        first: datetime.date,
+        days: int,
+        per_day: int,
+        seed: int= 0
+) -> Iterator[Flight]:
+    rng = random.Random(seed)
+    for day in range(days):
+        date = first + datetime.timedelta(days= day)
+        minutes = sorted(rng.randrange(24 * 60) for _ in range(per_day))
+        for minute in minutes:
+            origin, destination = rng.sample(AIRPORTS, 2)
+            yield Flight(
+                date,
+                datetime.time(minute // 60, minute % 60),
+                f"IB{rng.randrange(10000):04d}",
+                origin,
+                destination,
+                rng.randrange(200),
+                rng.randrange(2000, 60000)
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "Local flight schedule")
+    commands = parser.add_subparsers(dest= 'command', required= True)
+    generate = commands.add_parser('generate', help= "Write a random schedule")
+    generate.add_argument('path')
+    generate.add_argument('--first', type= datetime.date.fromisoformat, default= datetime.date.today())
+    generate.add_argument('--days', type= int, default= 365)
+    generate.add_argument('--per-day', type= int, default= 1000)
+    search = commands.add_parser('search', help= "Flights between two dates")
+    search.add_argument('path')
+    search.add_argument('first', type= datetime.date.fromisoformat)
+    search.add_argument('last', type= datetime.date.fromisoformat)
+    search.add_argument('--origin')
+    search.add_argument('--destination')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        with open(args.path, 'wb') as f:
+            n = write_schedule(f, random_flights(args.first, args.days, args.per_day))
+        print(f"{n} flights written to {args.path}", file= sys.stderr)
+    else:
+        schedule = FlightSchedule(args.path)
+        flights = schedule.between(args.first, args.last)
+        for flight in flights.filter(args.origin, args.destination):
+            print(
+                f"{flight.date} {flight.departure:%H:%M} {flight.number}"
+                f" {flight.origin}-{flight.destination}"
+                f" {flight.seats:3} seats {flight.price / 100:8.2f}"
+            )
+        schedule.close()
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import http.client
+import json
+import queue
+import socket
+import threading
+from typing import Optional
+import urllib.parse
+import uuid
+
+from models import CancellationToken, FlightBookerBackend, FlightBookerData
+
+
+# Cliente del servidor de reservas (ver `booking_server.py`). Abrir la
+# conexión es lo que más cuesta de CONTACTING_SERVER, así que las
+# conexiones se reutilizan (keep-alive) desde un pool limitado: sólo
+# se paga una vez por conexión y no una vez por reserva.
+
+
+class HttpConnection:
+    def __init__(self, http_connection: http.client.HTTPConnection, reused: bool) -> None:
+        self.http = http_connection
+        self.reused = reused
+        # Sólo se devuelve al pool si la respuesta se leyó entera
+        self.reusable = False
+        self.released = False
+        self.cancelled = False
+        # `cancel` llega desde cualquier thread, a la vez que el worker
+        # termina la reserva y la suelta
+        self.lock = threading.Lock()
+        self.body = None
+        # Lo genera el cliente para poder cancelar la reserva aunque
+        # todavía no tengamos la respuesta del servidor
+        self.request_id = None
+
+
+class HttpBackend(FlightBookerBackend):
+    def __init__(
+            self,
+            url: str,
+            max_connections: int= 8,
+            timeout: Optional[float]= 10.0,
+            keep_alive: bool= True
+    ) -> None:
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.lock = threading.Lock()
+        self.n_connects = 0
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        connection = http.client.HTTPConnection(self.host, self.port, timeout= self.timeout)
+        connection.connect()
+        with self.lock:
+            self.n_connects += 1
+        return connection
+
+    def connect(self, token: CancellationToken) -> HttpConnection:
+        # Si todas las conexiones del pool están ocupadas, esperamos
+        # a que quede una libre, o a que se cancele la reserva
+        while not self.slots.acquire(timeout= 0.01):
+            token.check()
+        try:
+            token.check()
+            try:
+                return HttpConnection(self.idle.get_nowait(), reused= True)
+            except queue.Empty:
+                return HttpConnection(self._new_connection(), reused= False)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def send(
+            self,
+            connection: HttpConnection,
+            booking_data: FlightBookerData,
+            token: CancellationToken
+    ) -> None:
+        token.check()
+        connection.request_id = uuid.uuid4().hex
+        connection.body = json.dumps({
+            'one_way': booking_data.one_way,
+            'start_date': _isoformat(booking_data.start_date),
+            'return_date': _isoformat(booking_data.return_date),
+        }).encode()
+        self._request(connection)
+
+    def _request(self, connection: HttpConnection) -> None:
+        # Con el cuerpo en `bytes`, cabeceras y cuerpo salen en el mismo
+        # paquete y no nos paramos esperando el ACK
+        connection.http.request(
+            'POST',
+            "/bookings",
+            body= connection.body,
+            headers= {
+                'Content-Type': "application/json",
+                'Booking-Request-Id': connection.request_id,
+            }
+        )
+
+    def receive(self, connection: HttpConnection, token: CancellationToken) -> str:
+        try:
+            response = self._get_response(connection, token)
+            answer = json.loads(response.read())
+        except (http.client.HTTPException, ValueError) as e:
+            raise IOError(f"Malformed answer from the server: {e}") from e
+        connection.reusable = self.keep_alive and not response.will_close
+        if response.status != 201:
+            raise IOError(answer.get('error', f"Booking failed with HTTP {response.status}"))
+        return answer['id']
+
+    def _get_response(
+            self,
+            connection: HttpConnection,
+            token: CancellationToken
+    ) -> http.client.HTTPResponse:
+        try:
+            return connection.http.getresponse()
+        except http.client.RemoteDisconnected:
+            # Si hemos cortado nosotras la conexión al cancelar, no hay
+            # que volver a intentarlo
+            if not connection.reused or token.cancelled:
+                raise
+        # El servidor cerró la conexión mientras estaba en el pool y
+        # la reserva ni llegó. Probamos con una nueva.
+        connection.http.close()
+        connection.http = self._new_connection()
+        connection.reused = False
+        self._request(connection)
+        return connection.http.getresponse()
+
+    def release(self, connection: HttpConnection) -> None:
+        # Una vez suelta, `cancel` ya no la toca: puede estar en manos
+        # de otra reserva
+        with connection.lock:
+            connection.released = True
+            reusable = connection.reusable and not connection.cancelled
+            connection.reusable = False
+            if reusable:
+                self.idle.put(connection.http)
+            else:
+                connection.http.close()
+        self.slots.release()
+
+    def cancel(self, connection: HttpConnection) -> None:
+        # Cortamos la conexión para que el worker que espera la
+        # respuesta quede libre ya, y avisamos al servidor en segundo
+        # plano. Si la reserva ya terminó, la conexión puede estar
+        # otra vez en el pool y no es nuestra.
+        with connection.lock:
+            sock = connection.http.sock
+            if not connection.released:
+                # Aunque `receive` la marque después como reutilizable
+                connection.cancelled = True
+                connection.reusable = False
+                if sock is not None:
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+        if connection.request_id is not None:
+            self.executor.submit(self._cancel_request, connection.request_id)
+
+    def _cancel_request(self, request_id: str) -> None:
+        # Es lo mejor que podemos hacer: si falla, no hay a quién avisar
+        connection = http.client.HTTPConnection(self.host, self.port, timeout= self.timeout)
+        try:
+            connection.request('DELETE', f"/bookings/{request_id}")
+            connection.getresponse().read()
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _isoformat(date) -> Optional[str]:
+    return None if date is None else date.isoformat()
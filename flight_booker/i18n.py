@@ -0,0 +1 @@
+../common/i18n.py
\ No newline at end of file
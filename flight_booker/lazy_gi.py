@@ -0,0 +1 @@
+../common/lazy_gi.py
\ No newline at end of file
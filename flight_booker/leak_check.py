@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+# Comprobación de fugas en el ciclo de vida del presenter, sin Gtk:
+# hace reservas que terminan y reservas que se cancelan a medias,
+# cierra las ventanas, y mira qué sigue vivo y cuánta memoria queda
+# ocupada por cada reserva.
+#
+#   $ ./leak_check.py --cycles 500 --output leaks.json
+#
+# Sale con error si queda algo vivo que no debería, si la memoria
+# crece más de `--max-growth` bytes por reserva o si aparecen threads
+# que no son del pool de workers. Así vale como prueba de regresión.
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+import time
+import tracemalloc
+
+from bench_presenters import FakeProgressDialog, FakeView, wait_validation
+from date_utils import show_date
+from diagnostics import tracker
+from models import CancellationToken, FlightBookerBackend, FlightBookerData, FlightBookerModel
+from presenters import FlightBookerPresenter, FlightBookerSessions
+
+
+class QuickBackend(FlightBookerBackend):
+    # Como el simulado, en los threads del pool, pero sin esperar
+    def connect(self, token: CancellationToken) -> object:
+        token.sleep(0.0005)
+
+    def send(
+            self,
+            connection: object,
+            booking_data: FlightBookerData,
+            token: CancellationToken
+    ) -> None:
+        token.sleep(0.0005)
+
+    def receive(self, connection: object, token: CancellationToken) -> str:
+        token.sleep(0.0005)
+        return "ok"
+
+
+class LeakCheckProgressDialog(FakeProgressDialog):
+    def destroy(self) -> None:
+        if not self.destroyed:
+            self.view.n_open_dialogs -= 1
+        super().destroy()
+
+
+class LeakCheckView(FakeView):
+    # La vista de los benchmarks guarda todos los diálogos y mensajes,
+    # que aquí serían una fuga de la propia prueba. Sólo se cuentan
+    # los diálogos que siguen abiertos.
+    def __init__(self) -> None:
+        super().__init__()
+        self.n_open_dialogs = 0
+
+    def progress_dialog(self, title: str):
+        self.n_open_dialogs += 1
+        return LeakCheckProgressDialog(self)
+
+    def show_info(self, text: str) -> None:
+        pass
+
+    def show_error(self, text: str) -> None:
+        pass
+
+
+async def book(presenter: FlightBookerPresenter, cancel: bool) -> None:
+    presenter.on_book_clicked()
+    task = presenter.booking
+    if cancel:
+        # Cancela con la reserva ya en marcha, en un worker
+        await asyncio.sleep(0.0005)
+        presenter.on_book_cancelled()
+    await asyncio.gather(task, return_exceptions= True)
+
+
+async def check(cycles: int, warmup: int) -> dict:
+    model = FlightBookerModel(backend= QuickBackend())
+    sessions = FlightBookerSessions(model= model, view_factory= LeakCheckView)
+    presenter = sessions.open_session(None)
+    presenter.validation_delay = 0
+    presenter.on_start_date_changed(show_date(datetime.date.today()))
+    await wait_validation(presenter)
+    # El calendario de precios se carga una vez, no es de las reservas
+    while presenter.loading_fares is not None:
+        await asyncio.sleep(0.001)
+
+    # Las primeras reservas llenan cachés, el pool de workers, ...
+    for i in range(warmup):
+        await book(presenter, cancel= i % 2 == 1)
+    before = tracker.snapshot()
+    tracemalloc.reset_peak()
+    base_memory, _peak = tracemalloc.get_traced_memory()
+    t0 = time.perf_counter()
+    # La última termina sin cancelar, que es cuando nadie limpia
+    for i in range(cycles):
+        await book(presenter, cancel= (cycles - i) % 2 == 0)
+    elapsed = time.perf_counter() - t0
+    # Deja correr los callbacks que quedan en el loop: todavía sujetan
+    # el `gather` de la última reserva
+    await asyncio.sleep(0)
+    after = tracker.snapshot()
+    _current, peak = tracemalloc.get_traced_memory()
+    growth = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    retained_while_open = {
+        kind: count for kind, count in tracker.alive().items() if kind != 'presenter'
+    }
+
+    # Al cerrar la ventana no debe quedar ni el presenter, ni el
+    # diálogo de una reserva que estaba en marcha
+    view = presenter.view
+    presenter.on_book_clicked()
+    await asyncio.sleep(0.0005)
+    task = presenter.booking
+    presenter.on_closed()
+    await asyncio.gather(task, return_exceptions= True)
+    dialogs_left_open = view.n_open_dialogs
+    del presenter, task, view
+    await asyncio.sleep(0)
+    alive = tracker.alive()
+    workers = [name for name in tracker.threads() if name.startswith("FlightBooker")]
+    others = [name for name in tracker.threads() if not name.startswith("FlightBooker")]
+    return {
+        'name': "leak_check",
+        'cycles': cycles,
+        'ms_per_cycle': elapsed / cycles * 1e3,
+        'growth_bytes_per_cycle': growth / cycles,
+        'peak_bytes_per_cycle': (peak - base_memory) / cycles,
+        'retained_while_open': retained_while_open,
+        'retained_after_close': {kind: count for kind, count in alive.items() if count},
+        'tracked': dict(tracker.n_tracked),
+        'dialogs_left_open': dialogs_left_open,
+        'worker_threads': len(workers),
+        'max_workers': model.max_workers,
+        'other_threads': others,
+        'referrers': {
+            kind: tracker.referrers(kind) for kind, count in alive.items() if count
+        },
+        'top_growth': [str(stat) for stat in after.compare_to(before, 'lineno')[:5]],
+    }
+
+
+def failures(result: dict, max_growth: float) -> list[str]:
+    problems = []
+    for kind, count in result['retained_while_open'].items():
+        if count:
+            problems.append(f"{count} {kind} still alive after their booking ended")
+    for kind, count in result['retained_after_close'].items():
+        problems.append(f"{count} {kind} still alive after closing the window")
+    if result['dialogs_left_open']:
+        problems.append(f"{result['dialogs_left_open']} progress dialogs left open")
+    if result['growth_bytes_per_cycle'] > max_growth:
+        problems.append(f"memory grows {result['growth_bytes_per_cycle']:.0f} bytes per booking")
+    if result['worker_threads'] > result['max_workers'] or result['other_threads']:
+        problems.append(f"unexpected threads: {result['other_threads']}")
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "Presenter memory leak check")
+    parser.add_argument('--cycles', type= int, default= 200)
+    parser.add_argument('--warmup', type= int, default= 20)
+    parser.add_argument('--max-growth', type= float, default= 256, help= "bytes per booking")
+    parser.add_argument('--frames', type= int, default= 1, help= "tracemalloc traceback depth")
+    parser.add_argument('--output', help= "JSON file, stdout by default")
+    args = parser.parse_args()
+    tracker.enable(args.frames)
+    result = asyncio.run(check(args.cycles, args.warmup))
+    problems = failures(result, args.max_growth)
+    result['problems'] = problems
+    if args.output is None:
+        json.dump(result, sys.stdout, indent= 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent= 2)
+    for problem in problems:
+        print(f"LEAK: {problem}", file= sys.stderr)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import bisect
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Optional
+
+
+# Métricas en memoria del propio proceso: cuánto tarda cada fase de
+# las reservas y cómo terminan. Se pueden volcar en texto o en el
+# formato de Prometheus (p.e. para el textfile collector de
+# node_exporter) sin tener que usar un profiler.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: int= 1) -> None:
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]= LATENCY_BUCKETS) -> None:
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        # El último cuenta lo que pasa del mayor límite (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Estimación: el límite del bucket donde cae el cuantil
+        with self.lock:
+            if self.count == 0:
+                return None
+            rank = q * self.count
+            cumulative = 0
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                if cumulative >= rank:
+                    return bound
+            return float('inf')
+
+
+def _labels_text(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # nombre -> (tipo, ayuda, {etiquetas: métrica})
+        self.metrics = {}
+        self.export_hooks = []
+
+    def _get(self, kind: str, name: str, help: str, labels: dict[str, str], factory: Callable):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            _kind, _help, series = self.metrics.setdefault(name, (kind, help, {}))
+            if _kind != kind:
+                raise ValueError(f"{name=} is a {_kind}, not a {kind}")
+            if key not in series:
+                series[key] = factory()
+            return series[key]
+
+    def counter(self, name: str, help: str= "", **labels: str) -> Counter:
+        return self._get('counter', name, help, labels, Counter)
+
+    def histogram(self, name: str, help: str= "", **labels: str) -> Histogram:
+        return self._get('histogram', name, help, labels, Histogram)
+
+    def booking_timer(self) -> BookingTimer:
+        return BookingTimer(self)
+
+    def _snapshot(self) -> list[tuple[str, str, str, dict]]:
+        with self.lock:
+            return [
+                (name, kind, help, dict(series))
+                for name, (kind, help, series) in sorted(self.metrics.items())
+            ]
+
+    def render_text(self) -> str:
+        lines = []
+        for name, kind, _help, series in self._snapshot():
+            for labels, metric in sorted(series.items()):
+                label_text = _labels_text(labels)
+                if kind == 'counter':
+                    lines.append(f"{name}{label_text} {metric.value}")
+                else:
+                    quantiles = " ".join(
+                        f"p{int(q * 100)}<={metric.quantile(q)}"
+                        for q in (0.5, 0.9, 0.99)
+                    )
+                    lines.append(
+                        f"{name}{label_text} count={metric.count}"
+                        f" sum={metric.sum:.3f}s {quantiles}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, kind, help, series in self._snapshot():
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in sorted(series.items()):
+                if kind == 'counter':
+                    lines.append(f"{name}{_labels_text(labels)} {metric.value}")
+                    continue
+                with metric.lock:
+                    counts = list(metric.counts)
+                    total, count = metric.sum, metric.count
+                cumulative = 0
+                for bound, n in zip(metric.buckets + (float('inf'),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(
+                        f"{name}_bucket{_labels_text(labels + (('le', le),))} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{_labels_text(labels)} {total}")
+                lines.append(f"{name}_count{_labels_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str | Path, prometheus: bool= True) -> None:
+        # Se escribe aparte y se renombra, así quien lo lea nunca ve
+        # un fichero a medias
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.render_prometheus() if prometheus else self.render_text())
+        os.replace(tmp, path)
+
+    def add_export_hook(self, hook: Callable[[MetricsRegistry], None]) -> None:
+        self.export_hooks.append(hook)
+
+    def export(self) -> None:
+        for hook in self.export_hooks:
+            hook(self)
+
+
+class BookingTimer:
+    # Marca el principio de cada fase de una reserva. Al empezar una
+    # fase, o al terminar la reserva, se apunta lo que duró la
+    # anterior.
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self.registry = registry
+        self.started = time.monotonic()
+        self.phase_name = None
+        self.phase_started = self.started
+
+    def phase(self, name: str) -> float:
+        now = time.monotonic()
+        self._close_phase(now)
+        self.phase_name = name
+        self.phase_started = now
+        return now
+
+    def _close_phase(self, now: float) -> None:
+        if self.phase_name is not None:
+            self.registry.histogram(
+                "flight_booker_phase_seconds",
+                "Duration of each booking phase",
+                phase= self.phase_name
+            ).observe(now - self.phase_started)
+
+    def finish(self, result: str) -> None:
+        now = time.monotonic()
+        self._close_phase(now)
+        self.phase_name = None
+        self.registry.histogram(
+            "flight_booker_booking_seconds",
+            "Duration of whole bookings",
+            result= result
+        ).observe(now - self.started)
+        self.registry.counter(
+            "flight_booker_bookings_total",
+            "Finished bookings",
+            result= result
+        ).inc()
+
+
+def file_exporter(path: str | Path) -> Callable[[MetricsRegistry], None]:
+    # En texto si acaba en .txt, si no en formato Prometheus
+    prometheus = not str(path).endswith(".txt")
+    return lambda registry: registry.write(path, prometheus= prometheus)
+
+
+# El registro del proceso, salvo que se pase otro al modelo
+registry = MetricsRegistry()
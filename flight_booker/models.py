@@ -1,10 +1,33 @@
 from __future__ import annotations
 
+from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
 import datetime
-from enum import Enum, auto
+from enum import Enum, IntEnum, auto
+import itertools
+import queue
+import threading
 import time
-from typing import Iterator, NamedTuple, Optional
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Union
+)
 import random
+import uuid
+
+from fares import FareCalendar, get_fare_calendar
+from flight_schedule import FlightRange, FlightSchedule
+import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class FlightBookerData(NamedTuple):
@@ -17,37 +40,449 @@ class FlightBookerProgress(Enum):
     CONTACTING_SERVER = auto()
     SENDING_DATA = auto()
     WAITING_ANSWER = auto()
+    # Sólo si se reintenta una reserva que ha fallado
+    RETRYING = auto()
+
+
+class FlightBookerError(IntEnum):
+    # Los mismos casos que distingue el presenter al mostrar el
+    # feedback. Si falla más de un campo, cuenta el primero.
+    NONE = 0
+    START_DATE_MISSING = auto()
+    RETURN_DATE_MISSING = auto()
+    RETURN_BEFORE_START = auto()
+
+
+# Eventos de `book_many`: un paso del progreso, los datos de la
+# reserva realizada o el error con el que terminó
+FlightBookerEvent = Union[FlightBookerProgress, FlightBookerData, Exception]
+
+
+class FlightBookerCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    # Se pasa a lo largo de toda la reserva. Cancelarlo interrumpe
+    # las esperas en curso, sin tener que esperar a que terminen, y
+    # avisa a quien se haya apuntado con `on_cancel`.
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def cancel(self) -> None:
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        # Devuelve la función para desapuntarse
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]) -> None:
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+    def check(self) -> None:
+        if self.event.is_set():
+            raise FlightBookerCancelled("The booking was cancelled")
+
+    def sleep(self, seconds: float) -> None:
+        # Como `time.sleep`, pero termina en cuanto se cancela
+        if self.event.wait(seconds):
+            raise FlightBookerCancelled("The booking was cancelled")
+
+
+class FlightBookerBackend(ABC):
+    # El servidor de reservas. Cada fase de `FlightBookerProgress` es
+    # una llamada:
+    #   - CONTACTING_SERVER: `connect`, devuelve una conexión
+    #   - SENDING_DATA: `send`
+    #   - WAITING_ANSWER: `receive`, devuelve el id de la reserva o
+    #     lanza `IOError` si el servidor la rechaza
+    # y al terminar, aunque sea con error, `release` de la conexión.
+    #
+    # Si se cancela la reserva después de conectar, se llama a
+    # `cancel` desde el thread que cancela. No debe bloquear: tiene que
+    # desbloquear la E/S en curso y avisar al servidor como pueda.
+    #
+    # Las versiones `_async` son para el main loop. Por defecto
+    # ejecutan las bloqueantes en `executor`.
+    #
+    # Un backend al que le falte `connect`, `send` o `receive` falla al
+    # crearlo, no a mitad de una reserva.
+    executor: Optional[Executor] = None
+
+    @abstractmethod
+    def connect(self, token: CancellationToken) -> object:
+        raise NotImplementedError
+
+    @abstractmethod
+    def send(
+            self,
+            connection: object,
+            booking_data: FlightBookerData,
+            token: CancellationToken
+    ) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def receive(self, connection: object, token: CancellationToken) -> str:
+        raise NotImplementedError
+
+    def release(self, connection: object) -> None:
+        pass
+
+    def cancel(self, connection: object) -> None:
+        pass
+
+    async def _run_blocking(self, f: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, f, *args)
+
+    async def connect_async(self, token: CancellationToken) -> object:
+        # Un worker que ya está conectando no se puede interrumpir. Si
+        # se cancela la tarea mientras tanto, la conexión llega cuando
+        # ya nadie la espera: se suelta en cuanto llegue, o se queda
+        # ocupando su sitio en el pool para siempre.
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self.connect, token)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(self._release_late)
+            raise
+
+    def _release_late(self, future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.release(future.result())
+
+    async def send_async(
+            self,
+            connection: object,
+            booking_data: FlightBookerData,
+            token: CancellationToken
+    ) -> None:
+        await self._run_blocking(self.send, connection, booking_data, token)
+
+    async def receive_async(self, connection: object, token: CancellationToken) -> str:
+        return await self._run_blocking(self.receive, connection, token)
+
+
+class SimulatedBackend(FlightBookerBackend):
+    # No hay servidor, sólo esperas aleatorias y la mitad de las
+    # reservas rechazadas
+    def connect(self, token: CancellationToken) -> object:
+        token.sleep(random.uniform(0, 1))
+
+    def send(
+            self,
+            connection: object,
+            booking_data: FlightBookerData,
+            token: CancellationToken
+    ) -> None:
+        token.sleep(random.uniform(0, 1))
+
+    def receive(self, connection: object, token: CancellationToken) -> str:
+        token.sleep(random.uniform(0, 2))
+        return self._answer()
+
+    # En el main loop se cancela la tarea, y con ella `asyncio.sleep`
+    async def connect_async(self, token: CancellationToken) -> object:
+        await asyncio.sleep(random.uniform(0, 1))
+        token.check()
+
+    async def send_async(
+            self,
+            connection: object,
+            booking_data: FlightBookerData,
+            token: CancellationToken
+    ) -> None:
+        await asyncio.sleep(random.uniform(0, 1))
+        token.check()
+
+    async def receive_async(self, connection: object, token: CancellationToken) -> str:
+        await asyncio.sleep(random.uniform(0, 2))
+        token.check()
+        return self._answer()
+
+    def _answer(self) -> str:
+        ok = random.choice([True, False])
+        if not ok:
+            raise IOError("The server rejected the booking request")
+        return str(uuid.uuid4())
     
     
+def _booking_result(error: BaseException, token: CancellationToken) -> str:
+    if token.cancelled or isinstance(error, (FlightBookerCancelled, asyncio.CancelledError)):
+        return 'cancelled'
+    elif isinstance(error, GeneratorExit):
+        return 'abandoned'
+    elif isinstance(error, OSError):
+        return 'failure'
+    else:
+        return 'error'
+
+
 class FlightBookerModel:
     n_progress_steps = 3
+    max_workers = 32
+
+    def __init__(
+            self,
+            executor: Optional[Executor]= None,
+            backend: Optional[FlightBookerBackend]= None,
+            registry: Optional[metrics.MetricsRegistry]= None,
+            schedule: Optional[FlightSchedule]= None
+    ) -> None:
+        # Todas las reservas comparten el mismo pool de workers, en
+        # lugar de lanzar un thread nuevo por cada una
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers= self.max_workers,
+            thread_name_prefix= "FlightBooker"
+        )
+        self.backend = backend or SimulatedBackend()
+        if self.backend.executor is None:
+            self.backend.executor = self.executor
+        self.metrics = registry or metrics.registry
+        self.schedule = schedule
 
     def build_data(self) -> FlightBookerData:
         return FlightBookerData()
 
     def is_valid(self, data: FlightBookerData) -> bool:
-        return (
-            (
-                data.one_way and
-                data.start_date is not None
-            ) or
-            (
-                not data.one_way and
-                data.start_date is not None and
-                data.return_date is not None and
-                data.return_date >= data.start_date
-            )
+        # Las reglas están sólo en `validate`
+        return self.validate(data) == FlightBookerError.NONE
+
+    def find_flights(self, data: FlightBookerData) -> FlightRange:
+        # Los vuelos del día de ida, o entre la ida y la vuelta
+        if self.schedule is None:
+            raise ValueError("There is no flight schedule")
+        if not self.is_valid(data):
+            raise ValueError(f"Invalid {data=}")
+        last = data.start_date if data.one_way else data.return_date
+        return self.schedule.between(data.start_date, last)
+
+    def fare_calendar(self) -> Optional[FareCalendar]:
+        # La primera vez importa numpy y calcula la tabla, después está
+        # en caché. `None` si no hay numpy.
+        return get_fare_calendar(self.schedule)
+
+    def validate(self, data: FlightBookerData) -> FlightBookerError:
+        if data.start_date is None:
+            return FlightBookerError.START_DATE_MISSING
+        elif data.one_way:
+            return FlightBookerError.NONE
+        elif data.return_date is None:
+            return FlightBookerError.RETURN_DATE_MISSING
+        elif data.return_date < data.start_date:
+            return FlightBookerError.RETURN_BEFORE_START
+        else:
+            return FlightBookerError.NONE
+
+    def is_valid_batch(
+            self,
+            one_way: np.ndarray,
+            start_date: np.ndarray,
+            return_date: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # Valida columnas enteras de golpe: `one_way` es un array de
+        # bool y las fechas arrays de `datetime64`, con NaT cuando no
+        # hay fecha. Devuelve la máscara de las filas válidas y el
+        # `FlightBookerError` de cada una.
+        #
+        # numpy sólo hace falta si se usa esta función
+        import numpy as np
+
+        one_way = np.asarray(one_way, dtype= bool)
+        start_date = np.asarray(start_date)
+        return_date = np.asarray(return_date)
+        if start_date.dtype.kind != 'M' or return_date.dtype.kind != 'M':
+            raise ValueError(f"Dates must be datetime64, {start_date.dtype=} {return_date.dtype=}")
+        has_start = ~np.isnat(start_date)
+        has_return = ~np.isnat(return_date)
+        round_trip = ~one_way
+        errors = np.zeros(one_way.shape, dtype= np.uint8)
+        # Los mismos casos que `validate`, en orden inverso: de menos a
+        # más prioritario, cada caso pisa a los anteriores
+        errors[round_trip & has_start & has_return & (return_date < start_date)] = (
+            FlightBookerError.RETURN_BEFORE_START
         )
+        errors[round_trip & ~has_return] = FlightBookerError.RETURN_DATE_MISSING
+        errors[~has_start] = FlightBookerError.START_DATE_MISSING
+        return errors == FlightBookerError.NONE, errors
 
-    def do_book(self, booking_data: FlightBookerData) -> Iterator[FlightBookerProgress]:
+    def do_book(
+            self,
+            booking_data: FlightBookerData,
+            token: Optional[CancellationToken]= None,
+            undo_on_cancel: bool= False
+    ) -> Iterator[FlightBookerProgress]:
+        # Al terminar, el valor de `StopIteration` es el id de la
+        # reserva. Si se cancela `token`, lanza `FlightBookerCancelled`.
+        # Una vez hecha, cancelar `token` ya no la toca, salvo con
+        # `undo_on_cancel`: entonces la deshace.
+        token = token or CancellationToken()
         if not self.is_valid(booking_data):
             raise ValueError(f"Invalid {booking_data=}")
+        timer = self.metrics.booking_timer()
+        try:
+            booking_id = yield from self._book_phases(booking_data, token, timer, undo_on_cancel)
+        except BaseException as e:
+            timer.finish(_booking_result(e, token))
+            raise
+        timer.finish('success')
+        return booking_id
+
+    def _book_phases(
+            self,
+            booking_data: FlightBookerData,
+            token: CancellationToken,
+            timer: metrics.BookingTimer,
+            undo_on_cancel: bool
+    ) -> Iterator[FlightBookerProgress]:
         yield FlightBookerProgress.CONTACTING_SERVER
-        time.sleep(random.uniform(0, 1))
-        yield FlightBookerProgress.SENDING_DATA
-        time.sleep(random.uniform(0, 1))
-        yield FlightBookerProgress.WAITING_ANSWER
-        time.sleep(random.uniform(0, 2))
-        ok = random.choice([True, False])
-        if not ok:
-            raise IOError("The server rejected the booking request")
+        timer.phase(FlightBookerProgress.CONTACTING_SERVER.name)
+        token.check()
+        connection = self.backend.connect(token)
+        stop_cancelling = token.on_cancel(lambda: self.backend.cancel(connection))
+        try:
+            yield FlightBookerProgress.SENDING_DATA
+            timer.phase(FlightBookerProgress.SENDING_DATA.name)
+            token.check()
+            self.backend.send(connection, booking_data, token)
+            yield FlightBookerProgress.WAITING_ANSWER
+            timer.phase(FlightBookerProgress.WAITING_ANSWER.name)
+            token.check()
+            booking_id = self.backend.receive(connection, token)
+        except BaseException as e:
+            stop_cancelling()
+            # Cancelar puede cortar la conexión a mitad
+            if isinstance(e, OSError) and token.cancelled:
+                raise FlightBookerCancelled("The booking was cancelled") from e
+            raise
+        finally:
+            self.backend.release(connection)
+        if not undo_on_cancel:
+            stop_cancelling()
+        return booking_id
+
+    async def do_book_async(
+            self,
+            booking_data: FlightBookerData,
+            token: Optional[CancellationToken]= None,
+            undo_on_cancel: bool= False
+    ) -> AsyncIterator[FlightBookerProgress]:
+        # Igual que `do_book` pero las esperas no bloquean el thread,
+        # de modo que cada reserva cuesta una corutina en el main loop.
+        # Cancelar la tarea también cancela `token`, para que el
+        # servidor se entere y los workers queden libres.
+        token = token or CancellationToken()
+        if not self.is_valid(booking_data):
+            raise ValueError(f"Invalid {booking_data=}")
+        timer = self.metrics.booking_timer()
+        try:
+            async for step in self._book_phases_async(booking_data, token, timer, undo_on_cancel):
+                yield step
+        except BaseException as e:
+            timer.finish(_booking_result(e, token))
+            raise
+        timer.finish('success')
+
+    async def _book_phases_async(
+            self,
+            booking_data: FlightBookerData,
+            token: CancellationToken,
+            timer: metrics.BookingTimer,
+            undo_on_cancel: bool
+    ) -> AsyncIterator[FlightBookerProgress]:
+        try:
+            yield FlightBookerProgress.CONTACTING_SERVER
+            timer.phase(FlightBookerProgress.CONTACTING_SERVER.name)
+            connection = await self.backend.connect_async(token)
+        except asyncio.CancelledError:
+            token.cancel()
+            raise
+        stop_cancelling = token.on_cancel(lambda: self.backend.cancel(connection))
+        try:
+            yield FlightBookerProgress.SENDING_DATA
+            timer.phase(FlightBookerProgress.SENDING_DATA.name)
+            await self.backend.send_async(connection, booking_data, token)
+            yield FlightBookerProgress.WAITING_ANSWER
+            timer.phase(FlightBookerProgress.WAITING_ANSWER.name)
+            await self.backend.receive_async(connection, token)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                token.cancel()
+            stop_cancelling()
+            if isinstance(e, OSError) and token.cancelled:
+                raise FlightBookerCancelled("The booking was cancelled") from e
+            raise
+        finally:
+            self.backend.release(connection)
+        if not undo_on_cancel:
+            stop_cancelling()
+
+    def book_many(
+            self,
+            bookings: Iterable[FlightBookerData],
+            max_in_flight: int= 8
+    ) -> Iterator[tuple[int, FlightBookerEvent]]:
+        # Como mucho hay `max_in_flight` reservas en marcha a la vez.
+        # Los datos se consumen según van terminando las reservas, así
+        # que `bookings` puede ser un iterador tan largo como se quiera.
+        # Los eventos se entregan según se producen, no en orden.
+        if max_in_flight < 1:
+            raise ValueError(f"Invalid {max_in_flight=}")
+        events = queue.SimpleQueue()
+        token = CancellationToken()
+
+        def book(index: int, booking_data: FlightBookerData) -> None:
+            # Cada reserva con su token, enlazado con el de todas sólo
+            # mientras está en marcha: al terminar, cancelar el de todas
+            # no la toca, y no se acumulan callbacks en él
+            booking_token = CancellationToken()
+            unlink = token.on_cancel(booking_token.cancel)
+            try:
+                for step in self.do_book(booking_data, booking_token):
+                    events.put((index, step))
+            except FlightBookerCancelled:
+                pass
+            except Exception as e:
+                events.put((index, e))
+            else:
+                events.put((index, booking_data))
+            finally:
+                unlink()
+
+        pending = enumerate(bookings)
+        in_flight = 0
+        try:
+            for index, booking_data in itertools.islice(pending, max_in_flight):
+                self.executor.submit(book, index, booking_data)
+                in_flight += 1
+            while in_flight > 0:
+                index, event = events.get()
+                yield index, event
+                if not isinstance(event, FlightBookerProgress):
+                    in_flight -= 1
+                    for index, booking_data in itertools.islice(pending, 1):
+                        self.executor.submit(book, index, booking_data)
+                        in_flight += 1
+        finally:
+            # Si quien consume los eventos deja de hacerlo, se cancelan
+            # las reservas que quedan en marcha
+            token.cancel()
@@ -1,105 +1,245 @@
 from __future__ import annotations
 
 
+import asyncio
 import datetime
-import threading
-from typing import Optional
+import sys
+import time
+from typing import Callable, Optional
 
 
-from models import FlightBookerModel, FlightBookerProgress
-from views import FlightBookerView, UIText, run, run_on_main_thread
+from models import (
+    CancellationToken,
+    FlightBookerCancelled,
+    FlightBookerData,
+    FlightBookerModel,
+    FlightBookerProgress
+)
+from views import (
+    FlightBookerProgressDialog,
+    FlightBookerView,
+    UIText,
+    dispatcher,
+    run,
+    run_later,
+    run_on_main_loop
+)
 
 
-from date_utils import date_sample, parse_date, show_date
+from date_utils import complete_date, date_sample, parse_date, show_date
+from diagnostics import tracker
+from i18n import translator
 
 
 class FlightBookerPresenter:
     def __init__(
             self,
             model: Optional[FlightBookerModel]= None,
-            view: Optional[FlightBookerView]= None
+            view: Optional[FlightBookerView]= None,
+            validation_delay: float= 0.05,
+            on_closed: Optional[Callable[[FlightBookerPresenter], None]]= None
     ) -> None:
         self.model = model or FlightBookerModel()
         self.view = view or FlightBookerView()
+        self.closed_callback = on_closed
+        self.stop_translating = None
         self.data = self.model.build_data()
         self.start_date_text = ""
         self.return_date_text = ""
+        self.booking = None
+        self.booking_token = None
+        self.fares = None
+        self.loading_fares = None
+        # Los cambios que llegan seguidos (teclear rápido, pegar un
+        # texto, ...) se validan todos juntos una sola vez, como mucho
+        # `validation_delay` segundos después del primero de ellos
+        self.validation_delay = validation_delay
+        self.pending_validation = None
+        self.pending_since = None
+        self.feedback_latency = 0.0
+        self.max_feedback_latency = 0.0
+        tracker.track('presenter', self)
 
     def run(self, application_id: str) -> None:
         self.view.set_handler(self)
         run(application_id= application_id, on_activate= self.view.on_activate)
 
     def on_built(self, _view: FlightBookerView) -> None:
+        self.stop_translating = translator.on_change(self.on_language_changed)
+        self._update_view()
+        self.loading_fares = run_on_main_loop(self._load_fares())
+
+    def on_closed(self) -> None:
+        # Al cerrar la ventana no debe quedar nada que apunte a ella
+        self.on_book_cancelled()
+        if self.pending_validation is not None:
+            self.pending_validation.cancel()
+            self.pending_validation = None
+        if self.loading_fares is not None:
+            self.loading_fares.cancel()
+            self.loading_fares = None
+        if self.stop_translating is not None:
+            self.stop_translating()
+            self.stop_translating = None
+        if self.closed_callback is not None:
+            self.closed_callback(self)
+
+    def on_language_changed(self, _language: str) -> None:
+        # Los mensajes de error también se vuelven a traducir
+        self.view.retranslate()
         self._update_view()
     
     def on_flight_type_changed(self, one_way: bool) -> None:
         self.data = self.data._replace(one_way= one_way)
-        self._update_view()
+        self._schedule_validation()
     
     def on_start_date_changed(self, text: str) -> None:
-        text = text.strip()
-        self.start_date_text = text
-        date = parse_date(text)
-        self.data = self.data._replace(start_date= date)
-        self._update_view()
+        self.start_date_text = text.strip()
+        # Las sugerencias no esperan a la validación: buscarlas es
+        # mucho más rápido que teclear
+        self.view.show_start_date_suggestions(self._suggestions(self.start_date_text))
+        self._schedule_validation()
                 
     def on_return_date_changed(self, text: str) -> None:
-        text = text.strip()
-        self.return_date_text = text
-        date = parse_date(text)
-        self.data = self.data._replace(return_date= date)
+        self.return_date_text = text.strip()
+        self.view.show_return_date_suggestions(self._suggestions(self.return_date_text))
+        self._schedule_validation()
+
+    def _suggestions(self, text: str) -> list[str]:
+        # Si ya está completa, no hay nada que sugerir
+        return [suggestion for suggestion in complete_date(text) if suggestion != text]
+
+    def _schedule_validation(self) -> None:
+        if self.pending_validation is None:
+            self.pending_since = time.monotonic()
+            self.pending_validation = run_later(
+                self.validation_delay,
+                self._validate
+            )
+
+    def _validate(self) -> None:
+        if self.pending_validation is None:
+            return
+        self.pending_validation.cancel()
+        self.pending_validation = None
+        self.data = self.data._replace(
+            start_date= parse_date(self.start_date_text),
+            return_date= parse_date(self.return_date_text)
+        )
         self._update_view()
+        # Tiempo desde el primer cambio hasta que la usuaria ve el
+        # feedback. No debería pasar de `validation_delay` más lo que
+        # tarde en llegar el siguiente frame del main loop.
+        self.feedback_latency = time.monotonic() - self.pending_since
+        self.max_feedback_latency = max(self.max_feedback_latency, self.feedback_latency)
     
     def on_book_clicked(self) -> None:
-        dialog = self.view.progress_dialog(UIText.BOOKING.value)
-
-        def do_book() -> None:
-            generator = self.model.do_book(self.data)
-            try:
-                for step in generator:
-                    if self.book_cancelled:
-                        generator.close()
-                        # Queda sin resolver cómo cancelamos el
-                        # booking en el servidor
-                        break
-                    if step == FlightBookerProgress.CONTACTING_SERVER:
-                        run_on_main_thread(
-                            dialog.update_progress,
-                            UIText.CONTACTING_SERVER.value
-                        )
-                    elif step ==  FlightBookerProgress.SENDING_DATA:
-                        run_on_main_thread(
-                            dialog.update_progress,
-                            UIText.SENDING_DATA.value
-                        )
-                    elif step == FlightBookerProgress.WAITING_ANSWER:
-                        run_on_main_thread(
-                            dialog.update_progress,
-                            UIText.WAITING_ANSWER.value
-                        )
-                    else:
-                        run_on_main_thread(
-                            dialog.update_progress,
-                            str(step)
-                        )
-                else:
-                    run_on_main_thread(do_book_continuation)
-            except IOError as e:
-                text = str(e)
-                run_on_main_thread(do_book_continuation, text)
+        # Puede haber cambios todavía sin validar
+        self._validate()
+        if not self.model.is_valid(self.data):
+            return
+        dialog = self.view.progress_dialog(UIText.BOOKING.text)
+        self.booking_token = CancellationToken()
+        self.booking = run_on_main_loop(
+            self._book(self.data, dialog, self.booking_token)
+        )
+        tracker.track('booking', self.booking)
+        tracker.track('token', self.booking_token)
+        tracker.track('progress_dialog', dialog)
 
-        def do_book_continuation(error: Optional[str]= None) -> None:
+    def on_book_cancelled(self) -> None:
+        # El token corta las esperas en curso y avisa al servidor, la
+        # tarea deja de actualizar el diálogo
+        if self.booking is not None:
+            self.booking_token.cancel()
+            self.booking.cancel()
+            self.booking = None
+            self.booking_token = None
+
+    async def _book(
+            self,
+            data: FlightBookerData,
+            dialog: FlightBookerProgressDialog,
+            token: CancellationToken
+    ) -> None:
+        # Ya no necesitamos un thread por reserva: los pasos llegan
+        # directamente al main loop. Con muchas reservas a la vez, el
+        # diálogo sólo se pinta una vez por frame, con el último paso.
+        try:
+            async for step in self.model.do_book_async(data, token):
+                dispatcher.post(dialog, dialog.update_progress, self._progress_text(step))
+        except FlightBookerCancelled:
+            return
+        except IOError as e:
+            error = str(e)
+        else:
+            error = None
+        finally:
+            # Lo que falte por pintar ya no vale, el diálogo se cierra.
+            # También al cancelar la tarea (`CancelledError`), que es lo
+            # que pasa si se cierra la ventana con la reserva en marcha:
+            # el diálogo no puede quedarse en pantalla.
+            dispatcher.discard(dialog)
             dialog.destroy()
-            if error is None:
-                self.view.show_info(UIText.BOOK_SUCCESS.value)
+            # Una reserva terminada no tiene nada que cancelar, y si se
+            # queda aquí sujeta la tarea y el diálogo hasta la siguiente
+            if self.booking_token is token:
+                self.booking = None
+                self.booking_token = None
+        if error is None:
+            self.view.show_info(UIText.BOOK_SUCCESS.text)
+        else:
+            self.view.show_error(error)
+
+    async def _load_fares(self) -> None:
+        # La tabla se calcula en milisegundos, pero importar numpy lleva
+        # bastante más: se hace en un worker, sin retrasar la ventana.
+        # Los precios son una ayuda: si fallan, se reserva sin ellos.
+        try:
+            self.fares = await asyncio.get_running_loop().run_in_executor(
+                self.model.executor,
+                self.model.fare_calendar
+            )
+        except Exception as e:
+            print(f"Fare calendar not available: {e!r}", file= sys.stderr)
+            return
+        finally:
+            self.loading_fares = None
+        self._update_fares()
+
+    def _update_fares(self) -> None:
+        # Junto a la ida, su precio o el de la vuelta más barata desde
+        # ese día. Junto a la vuelta, el de la ida y vuelta elegida.
+        if self.fares is None:
+            return
+        start_fare = None
+        return_fare = None
+        if self.data.start_date is not None:
+            if self.data.one_way:
+                start_fare = self._fare_text(UIText.PRICE, self.fares.one_way(self.data.start_date))
             else:
-                self.view.show_error(error)
-            
-        self.book_cancelled = False
-        threading.Thread(target= do_book, daemon= True).start()
+                start_fare = self._fare_text(UIText.FROM_PRICE, self.fares.cheapest_from(self.data.start_date))
+        if not self.data.one_way and self.model.is_valid(self.data):
+            return_fare = self._fare_text(
+                UIText.PRICE,
+                self.fares.round_trip(self.data.start_date, self.data.return_date)
+            )
+        self.view.show_fares(start_fare, return_fare)
 
-    def on_book_cancelled(self) -> None:
-        self.book_cancelled = True
+    def _fare_text(self, text: UIText, cents: Optional[int]) -> Optional[str]:
+        return None if cents is None else text.text.format(cents / 100)
+
+    def _progress_text(self, step: FlightBookerProgress) -> str:
+        if step == FlightBookerProgress.CONTACTING_SERVER:
+            return UIText.CONTACTING_SERVER.text
+        elif step == FlightBookerProgress.SENDING_DATA:
+            return UIText.SENDING_DATA.text
+        elif step == FlightBookerProgress.WAITING_ANSWER:
+            return UIText.WAITING_ANSWER.text
+        elif step == FlightBookerProgress.RETRYING:
+            return UIText.RETRYING.text
+        else:
+            return str(step)
         
     def _update_view(self) -> None:
         # Este planteamiento tiene sus problemas.
@@ -114,11 +254,11 @@ class FlightBookerPresenter:
             return_date_feedback = None
         else:
             if self.start_date_text == "":
-                start_date_feedback = ('error', UIText.MANDATORY_FIELD.value)
+                start_date_feedback = ('error', UIText.MANDATORY_FIELD.text)
             elif self.data.start_date is None:
                 start_date_feedback = (
                     'info',
-                    UIText.WRONG_DATE_FORMAT.value.format(show_date(date_sample))
+                    UIText.WRONG_DATE_FORMAT.text.format(show_date(date_sample))
                 )
             else:
                 start_date_feedback = None
@@ -126,14 +266,14 @@ class FlightBookerPresenter:
                 return_date_feedback = None
             else:
                 if self.return_date_text == "":
-                    return_date_feedback =  ('error', UIText.MANDATORY_FIELD.value)
+                    return_date_feedback =  ('error', UIText.MANDATORY_FIELD.text)
                 elif self.data.return_date is None:
                     return_date_feedback = (
                         'info',
-                        UIText.WRONG_DATE_FORMAT.value.format(show_date(date_sample))
+                        UIText.WRONG_DATE_FORMAT.text.format(show_date(date_sample))
                     )
                 else:
-                    return_date_feedback = ('error', UIText.INVALID_DATE.value)
+                    return_date_feedback = ('error', UIText.INVALID_DATE.text)
             book_enabled = False
         self.view.update(
             start_date_feedback= start_date_feedback,
@@ -141,3 +281,40 @@ class FlightBookerPresenter:
             return_date_enabled= not self.data.one_way,
             book_enabled= book_enabled,
         )
+        self._update_fares()
+
+
+class FlightBookerSessions:
+    # Varias ventanas de reserva en la misma aplicación, cada una con
+    # su presenter. Todas usan el mismo modelo, así que comparten los
+    # workers, las conexiones con el servidor y las cachés. Abrir una
+    # más cuesta una ventana, no un proceso.
+    #
+    # Volver a lanzar la aplicación también abre otra ventana: Gtk le
+    # pasa el `activate` a la que ya está en marcha.
+    def __init__(
+            self,
+            model: Optional[FlightBookerModel]= None,
+            view_factory: Callable[[], FlightBookerView]= FlightBookerView
+    ) -> None:
+        self.model = model or FlightBookerModel()
+        self.view_factory = view_factory
+        self.sessions = []
+
+    def run(self, application_id: str) -> None:
+        run(
+            application_id= application_id,
+            on_activate= self.open_session,
+            actions= {'new-window': (self.open_session, ["<Control>n"])}
+        )
+
+    def open_session(self, app) -> FlightBookerPresenter:
+        presenter = FlightBookerPresenter(
+            model= self.model,
+            view= self.view_factory(),
+            on_closed= self.sessions.remove
+        )
+        presenter.view.set_handler(presenter)
+        self.sessions.append(presenter)
+        presenter.view.on_activate(app)
+        return presenter
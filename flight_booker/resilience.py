@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+import random
+import threading
+import time
+from typing import AsyncIterator, Iterator, NamedTuple, Optional
+import warnings
+
+from flight_schedule import FlightSchedule
+import metrics
+from models import (
+    CancellationToken,
+    FlightBookerBackend,
+    FlightBookerCancelled,
+    FlightBookerData,
+    FlightBookerModel,
+    FlightBookerProgress
+)
+
+
+# El servidor rechaza muchas reservas sin motivo y a veces tarda mucho
+# en contestar. Este modelo reintenta las reservas rechazadas, con
+# esperas exponenciales y aleatorias entre intentos para no volver
+# todos a la vez, y puede lanzar una segunda petición si la primera
+# tarda más de lo normal, quedándose con la que conteste antes.
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int = 3
+    base_delay: float = 0.1
+    max_delay: float = 2.0
+    # Si una reserva tarda más que este percentil de las anteriores,
+    # se lanza otra igual. `None` para no hacerlo nunca.
+    #
+    # Sólo en `do_book_async`. `do_book` (y con él `book_many` y
+    # `book_import.py`) sólo reintenta: la segunda petición tendría
+    # que ir al mismo pool de workers que ya está lleno de reservas
+    # esperando, y se quedarían esperándose unas a otras.
+    hedge_percentile: Optional[float] = None
+    # Hasta tener estas muestras no sabemos qué es "tardar mucho"
+    hedge_min_samples: int = 20
+
+    def backoff(self, retry: int) -> float:
+        # "Full jitter": un valor al azar hasta el límite exponencial
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+
+class LatencyWindow:
+    # Duración de las últimas reservas que han tenido respuesta
+    def __init__(self, size: int= 200) -> None:
+        self.samples = deque(maxlen= size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int) -> Optional[float]:
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class ResilientFlightBookerModel(FlightBookerModel):
+    def __init__(
+            self,
+            executor: Optional[Executor]= None,
+            backend: Optional[FlightBookerBackend]= None,
+            registry: Optional[metrics.MetricsRegistry]= None,
+            policy: RetryPolicy= RetryPolicy(),
+            schedule: Optional[FlightSchedule]= None
+    ) -> None:
+        super().__init__(executor, backend, registry, schedule)
+        self.policy = policy
+        self.latencies = LatencyWindow()
+
+    def _is_transient(self, error: Exception) -> bool:
+        return isinstance(error, OSError)
+
+    def _count_retry(self) -> None:
+        self.metrics.counter("flight_booker_retries_total", "Retried bookings").inc()
+
+    def do_book(
+            self,
+            booking_data: FlightBookerData,
+            token: Optional[CancellationToken]= None
+    ) -> Iterator[FlightBookerProgress]:
+        token = token or CancellationToken()
+        if self.policy.hedge_percentile is not None:
+            warnings.warn(
+                "hedge_percentile only applies to do_book_async, do_book only retries",
+                RuntimeWarning,
+                stacklevel= 2
+            )
+        for attempt in range(1, self.policy.max_attempts + 1):
+            if attempt > 1:
+                yield FlightBookerProgress.RETRYING
+                self._count_retry()
+                token.sleep(self.policy.backoff(attempt - 1))
+            start = time.monotonic()
+            try:
+                booking_id = yield from super().do_book(booking_data, token)
+            except Exception as e:
+                if not self._is_transient(e) or attempt == self.policy.max_attempts:
+                    raise
+                self.latencies.add(time.monotonic() - start)
+            else:
+                self.latencies.add(time.monotonic() - start)
+                return booking_id
+
+    async def do_book_async(
+            self,
+            booking_data: FlightBookerData,
+            token: Optional[CancellationToken]= None
+    ) -> AsyncIterator[FlightBookerProgress]:
+        token = token or CancellationToken()
+        if not self.is_valid(booking_data):
+            raise ValueError(f"Invalid {booking_data=}")
+        for attempt in range(1, self.policy.max_attempts + 1):
+            if attempt > 1:
+                yield FlightBookerProgress.RETRYING
+                self._count_retry()
+                try:
+                    await asyncio.sleep(self.policy.backoff(attempt - 1))
+                except asyncio.CancelledError:
+                    token.cancel()
+                    raise
+                token.check()
+            try:
+                async for step in self._attempt_async(booking_data, token):
+                    yield step
+            except Exception as e:
+                if not self._is_transient(e) or attempt == self.policy.max_attempts:
+                    raise
+            else:
+                return
+
+    async def _attempt_async(
+            self,
+            booking_data: FlightBookerData,
+            token: CancellationToken
+    ) -> AsyncIterator[FlightBookerProgress]:
+        hedge_after = None
+        if self.policy.hedge_percentile is not None:
+            hedge_after = self.latencies.percentile(
+                self.policy.hedge_percentile,
+                self.policy.hedge_min_samples
+            )
+        if hedge_after is None:
+            start = time.monotonic()
+            try:
+                async for step in super().do_book_async(booking_data, token):
+                    yield step
+            except OSError:
+                if not token.cancelled:
+                    self.latencies.add(time.monotonic() - start)
+                raise
+            self.latencies.add(time.monotonic() - start)
+        else:
+            async for step in self._hedged_async(booking_data, token, hedge_after):
+                yield step
+
+    async def _hedged_async(
+            self,
+            booking_data: FlightBookerData,
+            token: CancellationToken,
+            hedge_after: float
+    ) -> AsyncIterator[FlightBookerProgress]:
+        # Cada petición tiene su propio token, enlazado con el de la
+        # reserva. Gana la primera que termina bien; las demás se
+        # cancelan, deshaciendo la reserva si también había terminado.
+        events = asyncio.Queue()
+        attempts = []
+
+        async def run(attempt_token: CancellationToken) -> None:
+            start = time.monotonic()
+            try:
+                # Si otra gana, cancelar ésta tiene que deshacerla aunque
+                # ya haya terminado
+                async for step in FlightBookerModel.do_book_async(
+                        self, booking_data, attempt_token, undo_on_cancel= True
+                ):
+                    events.put_nowait((attempt_token, step))
+            except Exception as e:
+                if isinstance(e, OSError) and not attempt_token.cancelled:
+                    self.latencies.add(time.monotonic() - start)
+                events.put_nowait((attempt_token, e))
+            else:
+                self.latencies.add(time.monotonic() - start)
+                events.put_nowait((attempt_token, None))
+
+        def launch() -> None:
+            attempt_token = CancellationToken()
+            unlink = token.on_cancel(attempt_token.cancel)
+            task = asyncio.get_running_loop().create_task(run(attempt_token))
+            attempts.append((attempt_token, unlink, task))
+
+        winner = None
+        try:
+            launch()
+            # Sólo se muestra el progreso que avanza, venga de donde venga
+            last_step = 0
+            failed = 0
+            error = None
+            while winner is None and failed < len(attempts):
+                timeout = hedge_after if len(attempts) == 1 else None
+                try:
+                    attempt_token, event = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    self.metrics.counter(
+                        "flight_booker_hedges_total",
+                        "Duplicate requests for slow bookings"
+                    ).inc()
+                    launch()
+                    continue
+                if event is None:
+                    winner = attempt_token
+                elif isinstance(event, Exception):
+                    failed += 1
+                    error = event
+                elif event.value > last_step:
+                    last_step = event.value
+                    yield event
+            if winner is None:
+                raise error
+        except asyncio.CancelledError:
+            token.cancel()
+            raise
+        finally:
+            for attempt_token, unlink, task in attempts:
+                # La ganadora ya no se puede cancelar desde fuera
+                unlink()
+                if attempt_token is not winner:
+                    attempt_token.cancel()
+                    task.cancel()
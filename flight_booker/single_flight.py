@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+import time
+from typing import AsyncIterator, Hashable, Optional
+
+from models import (
+    CancellationToken,
+    FlightBookerCancelled,
+    FlightBookerData,
+    FlightBookerProgress
+)
+from resilience import ResilientFlightBookerModel
+
+
+# Un doble click en "Book", o varias sesiones reservando lo mismo, no
+# deberían acabar en varias reservas. Las peticiones iguales que
+# coinciden en el tiempo comparten la misma reserva y ven el mismo
+# progreso. Las que llegan poco después de que termine bien se
+# contestan con esa misma reserva, sin volver al servidor.
+#
+# Sólo se hace con `do_book_async`, que es lo que usan las ventanas.
+# En una importación en bloque, dos filas iguales sí son dos reservas.
+
+
+class BookingCache:
+    # LRU con caducidad
+    def __init__(self, max_size: int= 256, ttl: float= 30.0) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: object) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last= False)
+
+
+_DONE = object()
+_CANCELLED = object()
+
+
+class _Flight:
+    # Una reserva en curso y quienes están esperando por ella
+    def __init__(self) -> None:
+        self.token = CancellationToken()
+        self.task = None
+        self.steps = []
+        self.outcome = None
+        self.subscribers = []
+
+    def subscribe(self) -> asyncio.Queue:
+        # Quien llega tarde ve antes todo el progreso que se perdió
+        queue = asyncio.Queue()
+        for step in self.steps:
+            queue.put_nowait(step)
+        if self.outcome is not None:
+            queue.put_nowait(self.outcome)
+        self.subscribers.append(queue)
+        return queue
+
+    def publish(self, event: object) -> None:
+        if isinstance(event, FlightBookerProgress):
+            self.steps.append(event)
+        else:
+            self.outcome = event
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+
+class SingleFlightMixin:
+    booking_cache_size = 256
+    booking_ttl = 30.0
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.in_flight = {}
+        self.recent_bookings = BookingCache(self.booking_cache_size, self.booking_ttl)
+
+    def _count(self, kind: str) -> None:
+        self.metrics.counter(
+            "flight_booker_deduplicated_total",
+            "Bookings answered by another identical booking",
+            kind= kind
+        ).inc()
+
+    async def do_book_async(
+            self,
+            booking_data: FlightBookerData,
+            token: Optional[CancellationToken]= None
+    ) -> AsyncIterator[FlightBookerProgress]:
+        token = token or CancellationToken()
+        if not self.is_valid(booking_data):
+            raise ValueError(f"Invalid {booking_data=}")
+        booking_data = self._booking_key(booking_data)
+        if self.recent_bookings.get(booking_data) is not None:
+            self._count('cached')
+            return
+        flight = self.in_flight.get(booking_data)
+        if flight is None:
+            flight = self.in_flight[booking_data] = _Flight()
+            flight.task = asyncio.get_running_loop().create_task(
+                self._run_flight(booking_data, flight)
+            )
+        else:
+            self._count('shared')
+        queue = flight.subscribe()
+        # El token se puede cancelar desde cualquier thread
+        loop = asyncio.get_running_loop()
+        stop_cancelling = token.on_cancel(
+            lambda: loop.call_soon_threadsafe(queue.put_nowait, _CANCELLED)
+        )
+        try:
+            while True:
+                event = await queue.get()
+                if event is _DONE:
+                    return
+                elif event is _CANCELLED:
+                    raise FlightBookerCancelled("The booking was cancelled")
+                elif isinstance(event, BaseException):
+                    raise event
+                yield event
+        except asyncio.CancelledError:
+            token.cancel()
+            raise
+        finally:
+            stop_cancelling()
+            self._unsubscribe(booking_data, flight, queue)
+
+    def _booking_key(self, booking_data: FlightBookerData) -> FlightBookerData:
+        # En un viaje sólo de ida, la fecha de vuelta que se quedó
+        # escrita (con el campo desactivado) no cuenta: es la misma
+        # reserva
+        if booking_data.one_way and booking_data.return_date is not None:
+            return booking_data._replace(return_date= None)
+        return booking_data
+
+    def _unsubscribe(self, booking_data: FlightBookerData, flight: _Flight, queue: asyncio.Queue) -> None:
+        flight.subscribers.remove(queue)
+        if not flight.subscribers and flight.outcome is None:
+            # Ya no la espera nadie: se cancela de verdad
+            if self.in_flight.get(booking_data) is flight:
+                del self.in_flight[booking_data]
+            flight.token.cancel()
+            flight.task.cancel()
+
+    async def _run_flight(self, booking_data: FlightBookerData, flight: _Flight) -> None:
+        try:
+            async for step in super().do_book_async(booking_data, flight.token):
+                flight.publish(step)
+        except asyncio.CancelledError:
+            flight.publish(FlightBookerCancelled("The booking was cancelled"))
+        except Exception as e:
+            flight.publish(e)
+        else:
+            self.recent_bookings.put(booking_data, time.time())
+            flight.publish(_DONE)
+        finally:
+            if self.in_flight.get(booking_data) is flight:
+                del self.in_flight[booking_data]
+
+
+class SingleFlightFlightBookerModel(SingleFlightMixin, ResilientFlightBookerModel):
+    pass
@@ -1,42 +1,184 @@
 from __future__ import annotations
 
 
+import asyncio
 from enum import Enum
-import gettext
-from typing import Callable, Protocol
-
-
-import gi
-gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk, GLib
+import os
+import threading
+from typing import Callable, Coroutine, Hashable, Optional, Protocol
 
 
 from date_utils import date_sample, show_date
-
-
-_ = gettext.gettext
-N_ = gettext.ngettext
+from i18n import gettext as _, gettext_noop as N_
+from lazy_gi import Gio, GLib, Gtk, quit_after_first_frame
 
 
 class UIText(Enum):
-    BOOKING = _("Booking ...")
-    BOOK_SUCCESS = _("Sucessfully booked")
-    CONTACTING_SERVER = _("Contacting server ...")
-    SENDING_DATA = _("Sending booking data ...")
-    WAITING_ANSWER = _("Waiting for server's response ...")
-    WRONG_DATE_FORMAT = _("Date format is: {0}")
-    MANDATORY_FIELD = _("This field is mandatory")
-    INVALID_DATE = _("Date is not valid")
-
-def run(application_id: str, on_activate: Callable) -> None:
+    # Los textos se traducen al usarlos, no al importar: el idioma
+    # puede no estar decidido todavía, o cambiar después
+    BOOKING = N_("Booking ...")
+    BOOK_SUCCESS = N_("Sucessfully booked")
+    CONTACTING_SERVER = N_("Contacting server ...")
+    SENDING_DATA = N_("Sending booking data ...")
+    WAITING_ANSWER = N_("Waiting for server's response ...")
+    RETRYING = N_("The server did not accept the booking, retrying ...")
+    WRONG_DATE_FORMAT = N_("Date format is: {0}")
+    MANDATORY_FIELD = N_("This field is mandatory")
+    INVALID_DATE = N_("Date is not valid")
+    PRICE = N_("{:.2f} €")
+    FROM_PRICE = N_("from {:.2f} €")
+
+    @property
+    def text(self) -> str:
+        return _(self.value)
+
+def run(
+        application_id: str,
+        on_activate: Callable,
+        actions: Optional[dict[str, tuple[Callable, list[str]]]]= None
+) -> None:
+    # El event loop de asyncio pasa a ser el main loop de GLib, así
+    # las corutinas se ejecutan en el mismo thread que Gtk
+    from gi.events import GLibEventLoopPolicy
+    asyncio.set_event_loop_policy(GLibEventLoopPolicy())
+    # Desde aquí los threads ya pueden mandar cambios a la interfaz
+    dispatcher.bind(main_loop())
     app = Gtk.Application(application_id= application_id)
     app.connect('activate', on_activate)
+    # Acciones de la aplicación: nombre -> (callback, atajos)
+    for name, (callback, accels) in (actions or {}).items():
+        action = Gio.SimpleAction.new(name, None)
+        action.connect('activate', lambda _action, _param, callback= callback: callback(app))
+        app.add_action(action)
+        app.set_accels_for_action(f"app.{name}", accels)
     app.run(None)
 
-    
-run_on_main_thread = GLib.idle_add
-# En este ejemplo sí falla si usamos Gtk desde un thread auxiliar
-# run_on_main_thread = lambda f, *args: f(*args)
+
+class UIDispatcher:
+    # Cambios en la interfaz que llegan de cualquier thread o corutina.
+    # En vez de un callback del main loop por cambio, se juntan y se
+    # aplican todos en uno solo, como mucho una vez por frame. De cada
+    # `key` (p.e. un diálogo) sólo se aplica el último cambio: los
+    # anteriores ya no se iban a ver.
+    def __init__(self, frame_interval: float= 1 / 60) -> None:
+        self.frame_interval = frame_interval
+        # Si no se fija, el del primero que lo use, que tiene que ser
+        # el main thread
+        self.loop = None
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.scheduled = False
+        self.last_flush = float('-inf')
+        self.n_posted = 0
+        self.n_coalesced = 0
+        self.n_flushes = 0
+        self.max_queue_depth = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        with self.lock:
+            self.loop = loop
+            # Si había un flush pendiente era en el loop anterior
+            self.scheduled = False
+
+    def _current_loop(self) -> asyncio.AbstractEventLoop:
+        # Cada `run()`, o cada `asyncio.run` de los benchmarks, trae un
+        # loop nuevo, y al anterior, ya cerrado, no se le puede mandar
+        # nada. Desde un worker se usa el último que se vio.
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = self.loop
+            if loop is None or loop.is_closed():
+                loop = main_loop()
+        if loop is not self.loop:
+            self.bind(loop)
+        return loop
+
+    def post(self, key: Optional[Hashable], f: Callable, *args) -> None:
+        loop = self._current_loop()
+        with self.lock:
+            if key is None:
+                # Sin clave no se sustituye nada
+                key = object()
+            elif key in self.pending:
+                # Al final, para respetar el orden de llegada
+                del self.pending[key]
+                self.n_coalesced += 1
+            self.pending[key] = (f, args)
+            self.n_posted += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self.pending))
+            if self.scheduled:
+                return
+            self.scheduled = True
+        loop.call_soon_threadsafe(self._schedule_flush)
+
+    def discard(self, key: Hashable) -> None:
+        # P.e. antes de destruir el diálogo
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def _schedule_flush(self) -> None:
+        delay = self.last_flush + self.frame_interval - self.loop.time()
+        self.loop.call_later(max(0.0, delay), self._flush)
+
+    def _flush(self) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.scheduled = False
+        self.last_flush = self.loop.time()
+        self.n_flushes += 1
+        # Como con los callbacks del main loop: uno que falla (p.e. el
+        # de un diálogo que ya no existe) se avisa y no se lleva por
+        # delante a los demás
+        for f, args in pending.values():
+            try:
+                f(*args)
+            except Exception as e:
+                self.loop.call_exception_handler({
+                    'message': f"Exception in UI callback {f!r}",
+                    'exception': e,
+                })
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.pending)
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'posted': self.n_posted,
+            'coalesced': self.n_coalesced,
+            'flushes': self.n_flushes,
+        }
+
+
+dispatcher = UIDispatcher()
+
+
+def run_on_main_thread(f: Callable, *args) -> None:
+    # En este ejemplo sí falla si usamos Gtk desde un thread auxiliar
+    dispatcher.post(None, f, *args)
+
+
+# asyncio sólo guarda referencias débiles a las tareas, tenemos que
+# mantenerlas nosotras mientras no terminen
+_running_tasks: set[asyncio.Task] = set()
+
+
+def main_loop() -> asyncio.AbstractEventLoop:
+    return asyncio.get_event_loop_policy().get_event_loop()
+
+
+def run_on_main_loop(coro: Coroutine) -> asyncio.Task:
+    task = main_loop().create_task(coro)
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return task
+
+
+def run_later(delay: float, callback: Callable, *args) -> asyncio.TimerHandle:
+    return main_loop().call_later(delay, callback, *args)
 
 
 class FlightBookerViewHandler(Protocol):
@@ -46,23 +188,30 @@ class FlightBookerViewHandler(Protocol):
     def on_return_date_changed(text: str) -> None: pass
     def on_book_clicked() -> None: pass
     def on_book_cancelled() -> None: pass
+    def on_closed() -> None: pass
     
 
 WINDOW_PADDING = 20
 
 
 def toogle_class(widget: Gtk.Widget, class_name: str, value: bool) -> None:
+    style = widget.get_style_context()
+    if style.has_class(class_name) == value:
+        # Cambiar las clases invalida el estilo del widget aunque
+        # no cambie nada
+        return
     if value:
-        widget.get_style_context().add_class(class_name)
+        style.add_class(class_name)
     else:
-        widget.get_style_context().remove_class(class_name)        
+        style.remove_class(class_name)
 
 
 class DateEntry:
     def __init__(
             self,
             label: str,
-            handler: Callable[[Gtk.Widget], None]
+            handler: Callable[[Gtk.Widget], None],
+            translated: Callable[[Callable[[], None]], None]
     ) -> tuple[Gtk.Widget, Gtk.Widget]:
         box = Gtk.Box(
             orientation= Gtk.Orientation.HORIZONTAL,
@@ -71,8 +220,9 @@ class DateEntry:
             hexpand= True
         )
         box.append(
-            Gtk.Label(label= label, hexpand= True, halign= Gtk.Align.START)
+            label_widget := Gtk.Label(hexpand= True, halign= Gtk.Align.START)
         )
+        translated(lambda: label_widget.set_label(_(label)))
         vbox = Gtk.Box(
             orientation= Gtk.Orientation.VERTICAL,
             homogeneous= False,
@@ -86,52 +236,110 @@ class DateEntry:
                 halign= Gtk.Align.END
             )
         )
-        vbox.append(
-            msg := Gtk.Label(label= "Algho farias", wrap= True, hexpand= True, halign= Gtk.Align.START)
-        )
         box.append(vbox)
-        msg.get_style_context().add_class('error')
-        msg.hide()
-        entry.set_placeholder_text(_("Example: {}").format(show_date(date_sample)))
+        translated(lambda: entry.set_placeholder_text(
+            _("Example: {}").format(show_date(date_sample))
+        ))
         entry.connect('changed', handler)
         self.widget = box
         self.entry = entry
-        self.msg = msg
-
-    def show_feedback(self, feedback: Optional[tuple[str, str]]) -> None:
+        # El mensaje no se ve hasta que hay algún error, así que no lo
+        # creamos hasta entonces
+        self.vbox = vbox
+        self.msg = None
+        # También se crea con la primera sugerencia
+        self.completion = None
+        self.completion_store = None
+        self.suggestions = []
+        # Y el precio, cuando hay calendario de precios
+        self.fare = None
+        self.fare_text = None
+        # Lo último que se ha mostrado, para cambiar en Gtk sólo lo
+        # que sea distinto
+        self.feedback = None
+        self.sensitive = True
+
+    def show_feedback(self, feedback: Optional[tuple[str, str]]) -> bool:
         # Siempre que hay un feedback es porque el dato no es correcto,
         # y al reves, si no hay feeback es porque el datao es correcto.
+        #
+        # Devuelve si ha cambiado el mensaje, y con él, puede que el
+        # tamaño que ocupa.
+        if feedback == self.feedback:
+            return False
+        if feedback is not None and feedback[0] not in ('error', 'info'):
+            raise ValueError(f"Unkown feedback.{feedback=}")
+        previous = self.feedback
+        self.feedback = feedback
         if feedback is None:
             toogle_class(self.entry, 'error', False)
             self.msg.hide()
-        else:
-            cls_name, text = feedback
+            return True
+        cls_name, text = feedback
+        if self.msg is None:
+            self.msg = Gtk.Label(label= text, wrap= True, hexpand= True, halign= Gtk.Align.START)
+            self.vbox.append(self.msg)
+        if previous is None:
             toogle_class(self.entry, 'error', True)
-            if cls_name == 'error':
-                toogle_class(self.msg, 'error', True)
-                toogle_class(self.msg, 'warning', False)
-                self.msg.set_label(text)
-                self.msg.show()
-            elif cls_name == 'info':
-                toogle_class(self.msg, 'warning', True)
-                toogle_class(self.msg, 'error', False)
-                self.msg.set_label(text)
-                self.msg.show()
-            else:
-                raise ValueError(f"Unkown feedback.{cls_name=}")
+        if previous is None or previous[0] != cls_name:
+            toogle_class(self.msg, 'error', cls_name == 'error')
+            toogle_class(self.msg, 'warning', cls_name == 'info')
+        if previous is None or previous[1] != text:
+            self.msg.set_label(text)
+        if previous is None:
+            self.msg.show()
+        return True
         
+    def show_suggestions(self, suggestions: list[str]) -> None:
+        if suggestions == self.suggestions:
+            return
+        self.suggestions = suggestions
+        if self.completion is None:
+            if not suggestions:
+                return
+            self.completion_store = Gtk.ListStore(str)
+            self.completion = Gtk.EntryCompletion(
+                model= self.completion_store,
+                text_column= 0,
+                minimum_key_length= 1
+            )
+            # Ya vienen filtradas del índice de fechas
+            self.completion.set_match_func(lambda *_args: True)
+            self.entry.set_completion(self.completion)
+        self.completion_store.clear()
+        for suggestion in suggestions:
+            self.completion_store.append([suggestion])
+
+    def show_fare(self, text: Optional[str]) -> None:
+        if text == self.fare_text:
+            return
+        self.fare_text = text
+        if self.fare is None:
+            if text is None:
+                return
+            self.fare = Gtk.Label(halign= Gtk.Align.END, valign= Gtk.Align.START)
+            toogle_class(self.fare, 'dim-label', True)
+            self.widget.append(self.fare)
+        self.fare.set_label(text or "")
+        self.fare.set_visible(text is not None)
+
     def set_sensitive(self, value: bool) -> None:
-        self.entry.set_sensitive(value)
+        if value != self.sensitive:
+            self.sensitive = value
+            self.entry.set_sensitive(value)
         
 
 class FlightBookerView:
     window: Gtk.ApplicationWindow = None
-    flight_type: Gtk.ComboBox = None
+    flight_type: Gtk.DropDown = None
     start_date_entry: DateEntry = None
     return_date_entry: DateEntry = None
     
     def __init__(self):
         self.handler = None
+        self.book_enabled = None
+        # Cómo volver a poner cada texto si cambia el idioma
+        self.retranslations = []
 
     def set_handler(self, handler: FlightBookerViewHandler) -> None:
         self.handler = handler
@@ -140,12 +348,21 @@ class FlightBookerView:
         self.build(app)
         self.handler.on_built(self)
 
+    def translated(self, update: Callable[[], None]) -> None:
+        update()
+        self.retranslations.append(update)
+
+    def retranslate(self) -> None:
+        for update in self.retranslations:
+            update()
+
     def build(self, app: Gtk.Application) -> None:
-        self.window = win = Gtk.ApplicationWindow(
-            title= _("Flight Booker"),
-        )    
+        self.window = win = Gtk.ApplicationWindow()
+        self.translated(lambda: win.set_title(_("Flight Booker")))
         app.add_window(win)
         win.connect("destroy", lambda win: win.close())
+        win.connect("destroy", lambda _win: self.handler.on_closed())
+        win.connect("destroy", lambda _win: self._clear_dialog_pools())
 
         box = Gtk.Box(
             orientation= Gtk.Orientation.VERTICAL,
@@ -160,33 +377,32 @@ class FlightBookerView:
         box.append(self.start_date_input())
         box.append(self.return_date_input())
         box.append(book_button := Gtk.Button(
-            label= _("Book"),
             hexpand= False,
             halign= Gtk.Align.CENTER)
         )
+        self.translated(lambda: book_button.set_label(_("Book")))
         self.book_button = book_button
         book_button.connect('clicked', lambda _wg: self.handler.on_book_clicked())
 
         win.set_child(box)
+        self._build_dialog_pools()
+        GLib.idle_add(self._prebuild_dialogs, priority= GLib.PRIORITY_LOW)
+        if os.environ.get('STARTUP_BENCH'):
+            quit_after_first_frame(win)
         win.present()
 
     def flight_type_input(self) -> Gtk.Widget:
-        flight_type_store = Gtk.ListStore(str)
-        flight_type_store.append([_("one-way flight")])
-        flight_type_store.append([_("return flight")])
-        self.flight_type = flight_type = Gtk.ComboBox(
-            model=flight_type_store,
-            entry_text_column= 0,
-            active= 0,
-            hexpand= False,
-            halign= Gtk.Align.START
-        )
-        renderer_text = Gtk.CellRendererText()
-        flight_type.pack_start(renderer_text, True)
-        flight_type.add_attribute(renderer_text, "text", 0)
+        # Con un `DropDown` las filas de la lista se crean al abrirla,
+        # no al construir la ventana como con `ListStore` y `ComboBox`
+        self.flight_type = flight_type = Gtk.DropDown()
+        self.translated(self._update_flight_types)
+        flight_type.set_hexpand(False)
+        flight_type.set_halign(Gtk.Align.START)
         flight_type.connect(
-            'changed',
-            lambda wg: self.handler.on_flight_type_changed(one_way= wg.get_active() == 0)
+            'notify::selected',
+            lambda wg, _pspec: self.handler.on_flight_type_changed(
+                one_way= wg.get_selected() == 0
+            )
         )
         box = Gtk.Box(
             orientation= Gtk.Orientation.HORIZONTAL,
@@ -195,29 +411,49 @@ class FlightBookerView:
             hexpand= True
         )
         box.append(
-            Gtk.Label(
-                label= _("Flight type:"),
+            label := Gtk.Label(
                 hexpand= True,
                 halign= Gtk.Align.START
             )
         )
+        self.translated(lambda: label.set_label(_("Flight type:")))
         box.append(flight_type)
         return box
 
+    def _update_flight_types(self) -> None:
+        # Al cambiar el modelo se pierde la selección
+        selected = self.flight_type.get_selected() if self.flight_type.get_model() else 0
+        self.flight_type.set_model(
+            Gtk.StringList.new([_("one-way flight"), _("return flight")])
+        )
+        self.flight_type.set_selected(selected)
+
     def start_date_input(self) -> Gtk.Widget:
         self.start_date_entry = DateEntry(
-            _("Start date:"),
-            lambda wg: self.handler.on_start_date_changed(text= wg.get_text())
+            N_("Start date:"),
+            lambda wg: self.handler.on_start_date_changed(text= wg.get_text()),
+            self.translated
         )
         return self.start_date_entry.widget
     
     def return_date_input(self) -> Gtk.Widget:
         self.return_date_entry = DateEntry(
-            _("Return date:"),
-            lambda wg: self.handler.on_return_date_changed(text= wg.get_text())
+            N_("Return date:"),
+            lambda wg: self.handler.on_return_date_changed(text= wg.get_text()),
+            self.translated
         )
         return self.return_date_entry.widget
 
+    def show_start_date_suggestions(self, suggestions: list[str]) -> None:
+        self.start_date_entry.show_suggestions(suggestions)
+
+    def show_return_date_suggestions(self, suggestions: list[str]) -> None:
+        self.return_date_entry.show_suggestions(suggestions)
+
+    def show_fares(self, start_fare: Optional[str], return_fare: Optional[str]) -> None:
+        self.start_date_entry.show_fare(start_fare)
+        self.return_date_entry.show_fare(return_fare)
+
     def update(
             self,
             start_date_feedback: Optional[tuple[str, str]],
@@ -225,62 +461,167 @@ class FlightBookerView:
             return_date_enabled: bool,
             book_enabled: bool
     ) -> None:
-        self.start_date_entry.show_feedback(start_date_feedback)
-        self.return_date_entry.show_feedback(return_date_feedback)
+        start_resized = self.start_date_entry.show_feedback(start_date_feedback)
+        return_resized = self.return_date_entry.show_feedback(return_date_feedback)
         self.return_date_entry.set_sensitive(return_date_enabled)
-        self.book_button.set_sensitive(book_enabled)
-        # HACK: Parece la única forma "razonable" de que la ventana
-        # cambie el tamaño cuando aparece y desaparece el feedback
-        self.window.set_default_size(self.window.get_width(), 0)
-
-    def show_info(self, text: str) -> None:
-        dialog = Gtk.MessageDialog(
+        if book_enabled != self.book_enabled:
+            self.book_enabled = book_enabled
+            self.book_button.set_sensitive(book_enabled)
+        if start_resized or return_resized:
+            # HACK: Parece la única forma "razonable" de que la ventana
+            # cambie el tamaño cuando aparece y desaparece el feedback
+            self.window.set_default_size(self.window.get_width(), 0)
+
+    def _build_message_dialog(
+            self,
+            message_type: Gtk.MessageType,
+            buttons: Gtk.ButtonsType
+    ) -> Gtk.MessageDialog:
+        return Gtk.MessageDialog(
             transient_for= self.window,
             modal= True,
-            message_type= Gtk.MessageType.INFO,
-            buttons= Gtk.ButtonsType.OK,
-            text= text,
+            message_type= message_type,
+            buttons= buttons,
+            text= "",
+            secondary_text= ""
         )
-        dialog.connect('response', lambda d, _: d.destroy())
+
+    def _build_dialog_pools(self) -> None:
+        def build_info() -> Gtk.MessageDialog:
+            dialog = self._build_message_dialog(Gtk.MessageType.INFO, Gtk.ButtonsType.OK)
+            dialog.connect('response', lambda d, _: self.info_dialogs.release(d))
+            return dialog
+
+        def build_error() -> Gtk.MessageDialog:
+            dialog = self._build_message_dialog(Gtk.MessageType.ERROR, Gtk.ButtonsType.CLOSE)
+            dialog.connect('response', lambda d, _: self.error_dialogs.release(d))
+            return dialog
+
+        def build_progress() -> tuple[Gtk.MessageDialog, Gtk.Spinner]:
+            dialog = self._build_message_dialog(Gtk.MessageType.INFO, Gtk.ButtonsType.CLOSE)
+            dialog.get_message_area().append(spinner := Gtk.Spinner())
+            return dialog, spinner
+
+        self.info_dialogs = DialogPool(build_info, Gtk.Widget.hide, Gtk.Window.destroy)
+        self.error_dialogs = DialogPool(build_error, Gtk.Widget.hide, Gtk.Window.destroy)
+        self.progress_dialogs = DialogPool(
+            build_progress,
+            lambda item: item[0].hide(),
+            lambda item: item[0].destroy()
+        )
+
+    def _clear_dialog_pools(self) -> None:
+        # Los diálogos escondidos son `transient_for` la ventana: si no
+        # se destruyen, la mantienen viva después de cerrarla
+        self.info_dialogs.clear()
+        self.error_dialogs.clear()
+        self.progress_dialogs.clear()
+
+    def _prebuild_dialogs(self) -> bool:
+        # Cuando no hay nada más que hacer, para que la primera reserva
+        # no tenga que esperar a construirlo
+        self.progress_dialogs.prebuild(1)
+        return False
+
+    def show_info(self, text: str) -> None:
+        dialog = self.info_dialogs.acquire()
+        dialog.set_property('text', text)
         dialog.show()
 
     def show_error(self, text: str) -> None:
-        dialog = Gtk.MessageDialog(
-            transient_for= self.window,
-            modal= True,
-            message_type= Gtk.MessageType.ERROR,
-            buttons= Gtk.ButtonsType.CLOSE,
-            text= text,
-        )
-        dialog.connect('response', lambda d, _: d.destroy())
+        dialog = self.error_dialogs.acquire()
+        dialog.set_property('text', text)
         dialog.show()
 
     def progress_dialog(self, title: str) -> FlightBookerProgressDialog:
-        dialog = Gtk.MessageDialog(
-            transient_for= self.window,
-            modal= True,
-            message_type= Gtk.MessageType.INFO,
-            buttons= Gtk.ButtonsType.CLOSE,
-            text= title,
-            secondary_text= ""
-        )
-        return FlightBookerProgressDialog(dialog, self.handler)
+        dialog, spinner = self.progress_dialogs.acquire()
+        dialog.set_property('text', title)
+        dialog.set_property('secondary-text', "")
+        return FlightBookerProgressDialog(dialog, spinner, self.handler, self.progress_dialogs)
 
 
-class FlightBookerProgressDialog:
-    def __init__(self, dialog: Gtk.Dialog, handler: FlightBookerViewHandler):
-        def on_response(dialog: Gtk.Dialog, _response: int) -> None:
-            self.dialog.destroy()
-            self.handler.on_book_cancelled()
+class DialogPool:
+    # Los diálogos se esconden al cerrarlos y se vuelven a usar, en vez
+    # de construir y destruir uno (con todos sus widgets) cada vez
+    def __init__(
+            self,
+            build: Callable[[], object],
+            hide: Callable[[object], None],
+            destroy: Callable[[object], None],
+            max_idle: int= 4
+    ) -> None:
+        self.build = build
+        self.hide = hide
+        self.destroy = destroy
+        self.max_idle = max_idle
+        self.idle = []
+        self.closed = False
+        self.n_built = 0
+        self.n_reused = 0
+
+    def prebuild(self, n: int) -> None:
+        while not self.closed and len(self.idle) < n:
+            self.n_built += 1
+            self.idle.append(self.build())
+
+    def acquire(self) -> object:
+        if self.closed:
+            raise RuntimeError("The dialog pool is closed")
+        if self.idle:
+            self.n_reused += 1
+            return self.idle.pop()
+        self.n_built += 1
+        return self.build()
+
+    def release(self, item: object) -> None:
+        self.hide(item)
+        if not self.closed and len(self.idle) < self.max_idle:
+            self.idle.append(item)
+        else:
+            # Muchos abiertos a la vez, o la ventana ya cerrada: no nos
+            # quedamos con todos
+            self.destroy(item)
 
-        dialog.get_message_area().append(spinner := Gtk.Spinner())
+    def clear(self) -> None:
+        # Al cerrar la ventana. Los que estén en uso se destruyen al
+        # soltarlos.
+        self.closed = True
+        for item in self.idle:
+            self.destroy(item)
+        self.idle.clear()
+
+
+class FlightBookerProgressDialog:
+    # Un uso del diálogo, que es del pool. Después de `destroy` ya no
+    # toca el diálogo, aunque lo esté usando otra reserva.
+    def __init__(
+            self,
+            dialog: Gtk.MessageDialog,
+            spinner: Gtk.Spinner,
+            handler: FlightBookerViewHandler,
+            pool: DialogPool
+    ):
+        self.dialog = dialog
+        self.spinner = spinner
+        self.handler = handler
+        self.pool = pool
+        self.closed = False
+        self.response_id = dialog.connect('response', self.on_response)
         spinner.start()
-        dialog.connect('response', on_response)
         dialog.show()
-        self.dialog = dialog
+
+    def on_response(self, _dialog: Gtk.Dialog, _response: int) -> None:
+        self.destroy()
+        self.handler.on_book_cancelled()
 
     def update_progress(self, text: str) -> None:
-        self.dialog.set_property('secondary-text', text)
+        if not self.closed:
+            self.dialog.set_property('secondary-text', text)
         
     def destroy(self) -> None:
-        self.dialog.destroy()
+        if self.closed:
+            return
+        self.closed = True
+        self.dialog.disconnect(self.response_id)
+        self.spinner.stop()
+        self.pool.release((self.dialog, self.spinner))
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+# Benchmarks del presenter sin Gtk ni display: la vista es una
+# implementación en memoria y el "main loop" es una cola que vaciamos
+# nosotras.
+#
+#   $ ./bench_helloworld.py --output bench.json
+
+from __future__ import annotations
+
+import argparse
+import json
+import queue
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from count_log import CountLog
+from helloworld import DurableState, Presenter, State, get_count_text
+from i18n import translator
+
+
+class FakeView:
+    def __init__(self) -> None:
+        self.pending = queue.SimpleQueue()
+        self.label = None
+        self.saying = False
+        self.infos = []
+        self.n_retranslations = 0
+
+    def idle_add(self, f: Callable, *args) -> int:
+        self.pending.put((f, args))
+        return 0
+
+    def run_pending(self) -> None:
+        # Una iteración del main loop, esperando a que llegue algo
+        f, args = self.pending.get()
+        f(*args)
+
+    def build(self, app, presenter: Presenter) -> None:
+        pass
+
+    def update_count_label(self, count: int) -> None:
+        self.label = count
+
+    def show_saying_indicator(self, showing: bool) -> None:
+        self.saying = showing
+
+    def info(self, text: str) -> None:
+        self.infos.append(text)
+
+    def retranslate(self) -> None:
+        self.n_retranslations += 1
+
+
+class InstantState(State):
+    def incr_count(self, step: int= 1) -> int:
+        return self.count + step
+
+
+class SlowState(State):
+    # Como el de verdad, pero sin esperar 3 s
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+
+    def incr_count(self, step: int= 1) -> int:
+        time.sleep(self.delay)
+        return self.count + step
+
+
+def build_presenter(state: Optional[State]= None, coalesce_clicks: bool= False) -> Presenter:
+    presenter = Presenter(
+        state= state or InstantState(),
+        view= FakeView(),
+        coalesce_clicks= coalesce_clicks
+    )
+    presenter.on_activate(None)
+    return presenter
+
+
+def bench_say_hello(n: int) -> dict:
+    # Click, incremento en otro thread y commit en el main loop
+    presenter = build_presenter()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        presenter.on_say_hello_clicked(None)
+        presenter.view.run_pending()
+    elapsed = time.perf_counter() - t0
+    assert presenter.state.get_count() == n
+    return {
+        'name': "say_hello_throughput",
+        'clicks': n,
+        'clicks_per_s': n / elapsed,
+    }
+
+
+def bench_update_count(n: int) -> dict:
+    presenter = build_presenter()
+    t0 = time.perf_counter()
+    for i in range(n):
+        presenter._update_count(None)
+    elapsed = time.perf_counter() - t0
+    return {
+        'name': "update_count",
+        'calls': n,
+        'us_per_call': elapsed / n * 1e6,
+    }
+
+
+def bench_cancel(n: int) -> dict:
+    presenter = build_presenter()
+    latencies = []
+    for _ in range(n):
+        presenter.on_say_hello_clicked(None)
+        t0 = time.perf_counter()
+        presenter.on_say_hello_cancelled(None)
+        latencies.append(time.perf_counter() - t0)
+        assert not presenter.view.saying
+        presenter.view.run_pending()
+    latencies.sort()
+    return {
+        'name': "cancel_latency",
+        'cancels': n,
+        'median_s': latencies[len(latencies) // 2],
+        'max_s': latencies[-1],
+    }
+
+
+def bench_click_burst(n: int, delay: float) -> list[dict]:
+    # La usuaria hace `n` clicks seguidos. Sin juntarlos, cada click
+    # tiene que esperar a que termine el anterior.
+    results = []
+    for coalesce_clicks in (False, True):
+        presenter = build_presenter(SlowState(delay), coalesce_clicks)
+        t0 = time.perf_counter()
+        if coalesce_clicks:
+            for _ in range(n):
+                presenter.on_say_hello_clicked(None)
+            while presenter.view.saying:
+                presenter.view.run_pending()
+        else:
+            for _ in range(n):
+                presenter.on_say_hello_clicked(None)
+                presenter.view.run_pending()
+        elapsed = time.perf_counter() - t0
+        assert presenter.state.get_count() == n
+        results.append({
+            'name': f"click_burst_{'coalesced' if coalesce_clicks else 'serialized'}",
+            'clicks': n,
+            'incr_delay_s': delay,
+            'elapsed_s': elapsed,
+            'clicks_per_s': n / elapsed,
+        })
+    return results
+
+
+def bench_durable_commits(n: int) -> list[dict]:
+    # Un fsync por commit frente a juntarlos en lotes. El commit nunca
+    # hace el fsync él mismo, así que aquí lo pedimos a mano.
+    results = []
+    for name, sync_each in (("fsync_each", True), ("group_commit", False)):
+        with tempfile.TemporaryDirectory() as tmp:
+            state = DurableState(Path(tmp) / "count.log")
+            worst = 0.0
+            t0 = time.perf_counter()
+            for i in range(n):
+                t1 = time.perf_counter()
+                state.commit(i + 1)
+                if sync_each:
+                    state.log.sync()
+                worst = max(worst, time.perf_counter() - t1)
+            elapsed = time.perf_counter() - t0
+            state.close()
+            results.append({
+                'name': f"durable_commit_{name}",
+                'commits': n,
+                'commits_per_s': n / elapsed,
+                'max_commit_ms': worst * 1e3,
+                'syncs': state.log.n_syncs,
+                'compactions': state.log.n_compactions,
+            })
+    return results
+
+
+def bench_recovery(sizes: list[int]) -> list[dict]:
+    # Recuperar no depende de cuántos commits se han hecho
+    results = []
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "count.log"
+            log = CountLog(path)
+            for i in range(n):
+                log.append(i + 1)
+            log.close()
+            t0 = time.perf_counter()
+            log = CountLog(path)
+            elapsed = time.perf_counter() - t0
+            assert log.value == n
+            log.close()
+            results.append({
+                'name': f"recovery_after_{n}_commits",
+                'recovery_s': elapsed,
+                'records_replayed': log.n_recovered_records,
+            })
+    return results
+
+
+def bench_count_text(n: int) -> list[dict]:
+    # Las etiquetas se repiten con los mismos números: después de la
+    # primera vez no debería hacer falta evaluar la regla de plurales
+    results = []
+    for language in ("es", "ar", "zh"):
+        t0 = time.perf_counter()
+        translator.configure('HelloWorld', po_dir= Path(__file__).parent, language= language)
+        load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for i in range(n):
+            get_count_text(i % 100)
+        elapsed = time.perf_counter() - t0
+        results.append({
+            'name': f"count_text_{language}",
+            'calls': n,
+            'catalog_load_s': load,
+            'us_per_call': elapsed / n * 1e6,
+        })
+    return results
+
+
+def bench_switch_language(n: int) -> dict:
+    # Con los catálogos ya cargados, cambiar de idioma es sólo
+    # volver a poner los textos
+    presenter = build_presenter()
+    languages = ("es", "ar", "zh")
+    for language in languages:
+        translator.load(language)
+    t0 = time.perf_counter()
+    for i in range(n):
+        translator.set_language(languages[i % len(languages)])
+    elapsed = time.perf_counter() - t0
+    assert presenter.view.n_retranslations == n
+    return {
+        'name': "switch_language",
+        'switches': n,
+        'us_per_switch': elapsed / n * 1e6,
+    }
+
+
+def main(scale: int) -> list[dict]:
+    return [
+        bench_say_hello(1000 * scale),
+        bench_update_count(10000 * scale),
+        bench_cancel(100 * scale),
+        *bench_click_burst(50 * scale, 0.02),
+        *bench_durable_commits(2000 * scale),
+        *bench_recovery([1000 * scale, 100000 * scale]),
+        *bench_count_text(100000 * scale),
+        bench_switch_language(1000 * scale),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description= "Headless presenter benchmarks")
+    parser.add_argument('--scale', type= int, default= 1)
+    parser.add_argument('--output', help= "JSON file, stdout by default")
+    args = parser.parse_args()
+    results = main(args.scale)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent= 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent= 2)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import mmap
+import os
+from pathlib import Path
+import struct
+import threading
+import zlib
+
+
+# Guarda el contador en disco sin que cada click cueste un fsync.
+#
+# El fichero tiene tamaño fijo y está mapeado en memoria:
+#
+#   - Una cabecera con dos checkpoints (generación, nº de secuencia,
+#     valor y dónde sigue el log). Se escriben alternando, así si uno
+#     queda a medias siempre queda el otro.
+#
+#   - Detrás, un log de registros (nº de secuencia, valor). Añadir es
+#     sólo escribir en memoria: si el proceso muere, el kernel ya tiene
+#     los datos.
+#
+# Un thread hace el msync de todo lo que se ha ido escribiendo cada
+# `flush_interval` segundos (o al llegar a `max_batch`) y apunta un
+# checkpoint. Para recuperar el valor se lee el último checkpoint y
+# sólo los registros posteriores, que son como mucho un lote.
+#
+# `append` nunca espera al disco: el msync sólo lo hace ese thread, y
+# sin el lock, así que quien añade no se queda esperando por él.
+#
+# Como cada registro lleva el valor entero, no la diferencia, los
+# registros anteriores al checkpoint no sirven para nada. Compactar es
+# volver a escribir desde el principio del log cuando se llena, con un
+# checkpoint en memoria que apunta allí. Hasta que llega al disco, si
+# se va la luz, recuperar empieza en el checkpoint anterior, que tiene
+# su valor entero: la cadena de registros se corta donde ya no siguen
+# los números de secuencia, y como mucho se pierde lo que no se había
+# sincronizado todavía.
+
+MAGIC = b"HWCOUNT1"
+HEADER_SIZE = mmap.PAGESIZE
+# generación, seq, valor, offset, crc
+CHECKPOINT = struct.Struct("<QQqQI")
+# seq, valor, crc
+RECORD = struct.Struct("<QqI4x")
+
+
+def _crc(*fields) -> int:
+    return zlib.crc32(struct.pack("<" + "q" * len(fields), *fields))
+
+
+class CountLog:
+    def __init__(
+            self,
+            path: str | Path,
+            capacity: int= 64 * 1024,
+            flush_interval: float= 0.05,
+            max_batch: int= 1024
+    ) -> None:
+        self.path = Path(path)
+        self.capacity = max(capacity, HEADER_SIZE + RECORD.size)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        # Sólo un msync a la vez, sin bloquear a `append`
+        self.sync_lock = threading.Lock()
+        self.n_appends = 0
+        self.n_syncs = 0
+        self.n_compactions = 0
+        self.n_recovered_records = 0
+        self.closed = False
+
+        self.path.parent.mkdir(parents= True, exist_ok= True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < self.capacity:
+                os.ftruncate(fd, self.capacity)
+            self.capacity = os.fstat(fd).st_size
+            self.mm = mmap.mmap(fd, self.capacity)
+        finally:
+            os.close(fd)
+        self._recover()
+
+        self.flusher = threading.Thread(target= self._flush_loop, daemon= True)
+        self.flusher.start()
+
+    def _read_checkpoints(self) -> tuple[int, int, int, int, int]:
+        # El checkpoint válido más reciente, o uno vacío
+        best = (0, 0, 0, HEADER_SIZE, 0)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            return best
+        for slot in range(2):
+            start = len(MAGIC) + slot * CHECKPOINT.size
+            generation, seq, value, offset, crc = CHECKPOINT.unpack_from(self.mm, start)
+            if crc == _crc(generation, seq, value, offset) and generation > best[0]:
+                best = (generation, seq, value, offset, slot)
+        return best
+
+    def _recover(self) -> None:
+        generation, seq, value, offset, slot = self._read_checkpoints()
+        # Desde aquí puede haber registros que no estén en disco
+        self.synced_offset = offset
+        self.wrapped = False
+        # Sólo lo escrito después del checkpoint
+        while offset + RECORD.size <= self.capacity:
+            record_seq, record_value, crc = RECORD.unpack_from(self.mm, offset)
+            if record_seq != seq + 1 or crc != _crc(record_seq, record_value):
+                break
+            seq, value = record_seq, record_value
+            offset += RECORD.size
+            self.n_recovered_records += 1
+        self.value = value
+        self.seq = seq
+        self.offset = offset
+        self.generation = generation
+        self.slot = slot
+        # Lo recuperado aún no está cubierto por un checkpoint
+        self.pending = self.n_recovered_records
+        if self.mm[:len(MAGIC)] != MAGIC:
+            self.mm[:len(MAGIC)] = MAGIC
+            self._checkpoint(self.seq, self.value, self.offset)
+
+    def append(self, value: int) -> None:
+        with self.lock:
+            if self.closed:
+                raise ValueError("The log is closed")
+            if self.offset + RECORD.size > self.capacity:
+                self._compact()
+            self.seq += 1
+            RECORD.pack_into(self.mm, self.offset, self.seq, value, _crc(self.seq, value))
+            self.offset += RECORD.size
+            self.value = value
+            self.pending += 1
+            self.n_appends += 1
+            if self.pending >= self.max_batch:
+                # Lote lleno: se avisa al thread, no se espera por él
+                self.wakeup.notify()
+
+    def _compact(self) -> None:
+        # Sin msync: si el proceso muere, el kernel ya tiene el
+        # checkpoint y los registros que le siguen
+        self.offset = HEADER_SIZE
+        self._checkpoint(self.seq, self.value, self.offset)
+        self.wrapped = True
+        self.n_compactions += 1
+
+    def _checkpoint(self, seq: int, value: int, offset: int) -> None:
+        self.generation += 1
+        self.slot = 1 - self.slot
+        CHECKPOINT.pack_into(
+            self.mm,
+            len(MAGIC) + self.slot * CHECKPOINT.size,
+            self.generation, seq, value, offset,
+            _crc(self.generation, seq, value, offset)
+        )
+
+    def _flush_range(self, start: int, stop: int) -> None:
+        # msync sólo acepta offsets alineados a página
+        start -= start % mmap.PAGESIZE
+        if stop > start:
+            self.mm.flush(start, stop - start)
+
+    def _sync(self) -> None:
+        # Con el lock sólo se copia qué hay que escribir y el checkpoint
+        # que lo cubre. Primero los registros, después el checkpoint.
+        with self.sync_lock:
+            with self.lock:
+                if self.pending == 0 or self.mm.closed:
+                    return
+                seq, value, offset = self.seq, self.value, self.offset
+                start, wrapped = self.synced_offset, self.wrapped
+                compactions = self.n_compactions
+                self.pending = 0
+                self.wrapped = False
+            if wrapped:
+                self._flush_range(start, self.capacity)
+                start = HEADER_SIZE
+            self._flush_range(start, offset)
+            with self.lock:
+                # Si entretanto se ha compactado, el checkpoint de la
+                # compactación es más nuevo que éste
+                if self.n_compactions == compactions:
+                    self._checkpoint(seq, value, offset)
+            self.mm.flush(0, HEADER_SIZE)
+            self.synced_offset = offset
+            self.n_syncs += 1
+
+    def sync(self) -> None:
+        self._sync()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self.lock:
+                if self.pending < self.max_batch and not self.closed:
+                    self.wakeup.wait(self.flush_interval)
+                if self.closed:
+                    return
+            self._sync()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.wakeup.notify_all()
+        self.flusher.join()
+        self._sync()
+        with self.sync_lock:
+            self.mm.close()
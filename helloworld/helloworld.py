@@ -1,20 +1,16 @@
 #!/usr/bin/env python3
 
 from __future__ import annotations
-import gettext
 import locale
+import os
 from pathlib import Path
 import threading
-from typing import Optional
+from typing import Callable, Optional
 
 
-import gi
-gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk, GLib
-
-
-_ = gettext.gettext
-N_ = gettext.ngettext
+from count_log import CountLog
+from i18n import gettext as _, ngettext as N_, translator
+from lazy_gi import GLib, Gtk, quit_after_first_frame
 
 
 class State:
@@ -32,6 +28,21 @@ class State:
         return self.count
 
 
+class DurableState(State):
+    # El contador sobrevive a la aplicación. Guardar cuesta escribir
+    # en memoria, el fsync se hace por lotes en segundo plano.
+    def __init__(self, path: Path) -> None:
+        self.log = CountLog(path)
+        self.count = self.log.value
+
+    def commit(self, state: int) -> None:
+        super().commit(state)
+        self.log.append(state)
+
+    def close(self) -> None:
+        self.log.close()
+
+
 def get_count_text(count: int) -> str:
     return N_(
         "I've said hello {0} time",
@@ -41,8 +52,6 @@ def get_count_text(count: int) -> str:
 
 
 class View:
-    idle_add = GLib.idle_add
-    
     WINDOW_PADDING: int = 24
 
     window: Gtk.ApplicationWindow = None
@@ -51,14 +60,30 @@ class View:
     cancel: Gtk.Button = None
     button: Gtk.Button = None
 
+    def __init__(self) -> None:
+        # Cómo volver a poner cada texto si cambia el idioma
+        self.retranslations = []
+
+    def idle_add(self, f: Callable, *args) -> int:
+        return GLib.idle_add(f, *args)
+
+    def translated(self, update: Callable[[], None]) -> None:
+        update()
+        self.retranslations.append(update)
+
+    def retranslate(self) -> None:
+        for update in self.retranslations:
+            update()
+
     def build(self, app: Gtk.Application, presenter: Presenter) -> None:
-        win = Gtk.ApplicationWindow(
-            title= _("Hello World!"),
-        )    
+        win = Gtk.ApplicationWindow()
+        self.translated(lambda: win.set_title(_("Hello World!")))
         app.add_window(win)
         win.connect("destroy", lambda win: win.close())
         win.set_child(self.counter(presenter))
         self.window = win
+        if os.environ.get('STARTUP_BENCH'):
+            quit_after_first_frame(win)
         win.present()
 
     def counter(self, presenter: Presenter) -> Gtk.Widget:
@@ -82,31 +107,36 @@ class View:
             halign= Gtk.Align.CENTER,
             hexpand= True
         )
-        spinner = Gtk.Spinner(hexpand= False)
-        spinner.hide()
-        cancel = Gtk.Button(label= _("Cancel"), hexpand= False)
-        cancel.hide()
-        cancel.connect('clicked', presenter.on_say_hello_cancelled)
         label_box.append(label)
-        label_box.append(spinner)
-        label_box.append(cancel)
-        button = Gtk.Button(
-            label= _("Say Hello"),
-            halign= Gtk.Align.CENTER
-        )
+        button = Gtk.Button(halign= Gtk.Align.CENTER)
+        self.translated(lambda: button.set_label(_("Say Hello")))
         box.append(label_box)
         box.append(button)
         button.connect('clicked', presenter.on_say_hello_clicked)
         self.label = label
-        self.spinner = spinner
-        self.cancel = cancel
+        self.label_box = label_box
+        self.presenter = presenter
         self.button = button
         return box
 
+    def _build_saying_indicator(self) -> None:
+        # El spinner y el botón de cancelar no se ven hasta el primer
+        # click, no hace falta crearlos antes de pintar la ventana
+        self.spinner = Gtk.Spinner(hexpand= False)
+        self.cancel = cancel = Gtk.Button(hexpand= False)
+        self.translated(lambda: cancel.set_label(_("Cancel")))
+        self.cancel.connect('clicked', self.presenter.on_say_hello_cancelled)
+        self.label_box.append(self.spinner)
+        self.label_box.append(self.cancel)
+
     def update_count_label(self, count: int) -> None:
         self.label.set_label(get_count_text(count))
 
     def show_saying_indicator(self, showing: bool) -> None:
+        if self.spinner is None:
+            if not showing:
+                return
+            self._build_saying_indicator()
         if showing:
             self.label.set_label("Counting ...")
             self.spinner.show()
@@ -130,11 +160,21 @@ class View:
 
 
 class Presenter:
-    def __init__(self, state: Optional[State]= None):
+    def __init__(
+            self,
+            state: Optional[State]= None,
+            view: Optional[View]= None,
+            coalesce_clicks: bool= False
+    ):
         state = state or State()
         self.state = state
-        self.view = View()
+        self.view = view or View()
         self.saying_hello_thread = None
+        # Con `coalesce_clicks` los clicks que llegan mientras se está
+        # diciendo hola no se rechazan: se acumulan y se cuentan todos
+        # juntos en el siguiente incremento
+        self.coalesce_clicks = coalesce_clicks
+        self.pending_clicks = 0
 
     def run(self) -> None:
         app = Gtk.Application(application_id= "es.udc.fic.ipm.HelloWorld")
@@ -143,24 +183,20 @@ class Presenter:
 
     def on_activate(self, app: Gtk.Application) -> None:
         self.view.build(app, self)
+        translator.on_change(self.on_language_changed)
+        self._update_count(None)
+
+    def on_language_changed(self, _language: str) -> None:
+        self.view.retranslate()
         self._update_count(None)
         
     def on_say_hello_clicked(self, _w: Gtk.Widget) -> None:
-        # Aprovechamos para organizar el código de otra manera
-        def say_hello() -> None:
-            state = self.state.incr_count()
-            View.idle_add(self._update_count, state, threading.current_thread())
-            # En python la creación de _closures_ tienen limitaciones,
-            # pero aquí prodríamos usarlos:
-            # View.idle_add(lambda: self._update_count(state, threading.current_thread())
-
-        if self.saying_hello_thread is not None:
-            self.view.info(_("I'm already in the process of saying hello"))
+        if self.saying_hello_thread is None:
+            self._start_saying_hello(1)
+        elif self.coalesce_clicks:
+            self.pending_clicks += 1
         else:
-            new_thread = threading.Thread(target= say_hello, daemon= True)
-            self.saying_hello_thread = new_thread
-            self.view.show_saying_indicator(True)
-            new_thread.start()
+            self.view.info(_("I'm already in the process of saying hello"))
 
         # Cuando la usuaria activa el botón
         # Preguntas, problemas, ...:
@@ -171,9 +207,28 @@ class Presenter:
         #   cómo las sincronizamos ?  P.e.: ¿ qué pasa si el click nº5
         #   termina antes que el nº4 ?
         #
+        # Con `coalesce_clicks` nunca hay dos incrementos a la vez,
+        # así que no puede pasar: los clicks del medio se suman en un
+        # solo `incr_count(step= n)`. Da igual cuántos clicks lleguen,
+        # cuestan como mucho dos esperas.
+
+    def _start_saying_hello(self, step: int) -> None:
+        # Aprovechamos para organizar el código de otra manera
+        def say_hello() -> None:
+            state = self.state.incr_count(step)
+            self.view.idle_add(self._update_count, state, threading.current_thread())
+            # En python la creación de _closures_ tienen limitaciones,
+            # pero aquí prodríamos usarlos:
+            # self.view.idle_add(lambda: self._update_count(state, threading.current_thread())
+
+        new_thread = threading.Thread(target= say_hello, daemon= True)
+        self.saying_hello_thread = new_thread
+        self.view.show_saying_indicator(True)
+        new_thread.start()
 
     def on_say_hello_cancelled(self, _w: Gtk.Widget) -> None:
         self.saying_hello_thread = None
+        self.pending_clicks = 0
         self._update_count(None)
         
     def _update_count(
@@ -185,6 +240,11 @@ class Presenter:
             # Si hay estado nuevo y no se cancelo el Thread
             self.state.commit(state)
             self.saying_hello_thread = None
+            if self.pending_clicks > 0:
+                # Partimos del estado ya guardado, así no se pierde
+                # ningún click
+                step, self.pending_clicks = self.pending_clicks, 0
+                self._start_saying_hello(step)
         if self.saying_hello_thread is None:
             self.view.show_saying_indicator(False)
             self.view.update_count_label(self.state.get_count())
@@ -194,9 +254,19 @@ if __name__ == '__main__':
     locale.setlocale(locale.LC_ALL, '')
     LOCALE_DIR = Path(__file__).parent / "locale"
     locale.bindtextdomain('HelloWorld', LOCALE_DIR)
-    gettext.bindtextdomain('HelloWorld', LOCALE_DIR)
-    gettext.textdomain('HelloWorld')
+    # Las traducciones se compilan al vuelo desde los .po de este
+    # directorio, y si no hay, se buscan los .mo instalados
+    translator.configure(
+        'HelloWorld',
+        po_dir= Path(__file__).parent,
+        mo_dir= LOCALE_DIR
+    )
     
-    presenter = Presenter()
-    presenter.run()
+    state_dir = Path(os.environ.get('XDG_STATE_HOME', Path.home() / ".local" / "state"))
+    state = DurableState(state_dir / "helloworld" / "count.log")
+    presenter = Presenter(state= state, coalesce_clicks= True)
+    try:
+        presenter.run()
+    finally:
+        state.close()
 